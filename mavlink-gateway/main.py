@@ -5,12 +5,21 @@ import hashlib
 import logging
 import math
 import os
+import queue
+import select
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Optional
+from urllib.parse import urlencode
 
+import orjson
 import requests
+import requests.auth
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 try:
     from pymavlink import mavutil
@@ -38,8 +47,19 @@ def env_float(name: str, default: float) -> float:
         return default
 
 
+# (epoch second, "YYYY-MM-DDTHH:MM:SS") for the last formatted timestamp; telemetry
+# runs at several Hz so the date/time prefix is almost always reused.
+_rfc3339_prefix: tuple[int, str] = (-1, "")
+
+
 def now_rfc3339() -> str:
-    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    global _rfc3339_prefix
+    seconds, micros = divmod(time.time_ns() // 1000, 1_000_000)
+    cached_seconds, prefix = _rfc3339_prefix
+    if cached_seconds != seconds:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+        _rfc3339_prefix = (seconds, prefix)
+    return f"{prefix}.{micros:06d}Z"
 
 
 def parse_rfc3339(value: object) -> Optional[datetime]:
@@ -57,7 +77,22 @@ def parse_rfc3339(value: object) -> Optional[datetime]:
         return None
 
 
-@dataclass
+def body_excerpt(resp: requests.Response, limit: int = 200) -> str:
+    # resp.text runs charset detection over the whole body; errors only need a short prefix.
+    return resp.content[:limit].decode("utf-8", "replace")
+
+
+# (lat, lon, altitude_m, heading_deg, speed_mps, timestamp) captured when the sample is queued.
+TelemetrySample = tuple[float, float, float, float, float, str]
+
+
+def sample_key(sample: TelemetrySample) -> tuple[float, ...]:
+    """Sample values rounded to reporting precision, ignoring the timestamp."""
+    lat, lon, altitude_m, heading_deg, speed_mps, _ = sample
+    return (round(lat, 7), round(lon, 7), round(altitude_m, 2), round(heading_deg, 1), round(speed_mps, 2))
+
+
+@dataclass(slots=True)
 class TelemetryState:
     lat: Optional[float] = None
     lon: Optional[float] = None
@@ -68,8 +103,18 @@ class TelemetryState:
     def ready(self) -> bool:
         return self.lat is not None and self.lon is not None and self.altitude_m is not None
 
+    def snapshot(self) -> TelemetrySample:
+        return (
+            self.lat,
+            self.lon,
+            self.altitude_m,
+            self.heading_deg or 0.0,
+            self.speed_mps or 0.0,
+            now_rfc3339(),
+        )
 
-@dataclass
+
+@dataclass(slots=True)
 class CommandState:
     current_mode: str = ""
     previous_mode: str = ""
@@ -78,6 +123,49 @@ class CommandState:
     active_target: Optional[tuple[float, float, float]] = None
 
 
+JSON_HEADERS = {"Content-Type": "application/json"}
+NDJSON_HEADERS = {"Content-Type": "application/x-ndjson"}
+
+
+class SessionTokenAuth(requests.auth.AuthBase):
+    """Bearer auth from the client's session token.
+
+    On 401/403 (when a registration token is configured) the token is re-minted and the
+    already-prepared request is replayed once, so callers never rebuild the request.
+    """
+
+    def __init__(self, client: AtcClient) -> None:
+        self.client = client
+
+    @staticmethod
+    def header(token: str) -> str:
+        return f"Bearer {token}"
+
+    def __call__(self, r: requests.PreparedRequest) -> requests.PreparedRequest:
+        r.headers["Authorization"] = self.header(self.client.ensure_session_token())
+        r.register_hook("response", self.handle_auth_failure)
+        return r
+
+    def handle_auth_failure(self, resp: requests.Response, **kwargs) -> requests.Response:
+        client = self.client
+        if resp.status_code not in (401, 403) or not client.registration_token:
+            return resp
+
+        logging.warning("%s rejected (auth); re-registering token", resp.request.path_url)
+        sent = resp.request.headers.get("Authorization", "")
+        token = client.renew_session_token(sent.removeprefix("Bearer "))
+
+        # Drain the rejected body so its connection goes back to the pool before replaying.
+        _ = resp.content
+        resp.close()
+        retry = resp.request.copy()
+        retry.headers["Authorization"] = self.header(token)
+        replayed = resp.connection.send(retry, **kwargs)
+        replayed.history.append(resp)
+        replayed.request = retry
+        return replayed
+
+
 class AtcClient:
     def __init__(
         self,
@@ -91,160 +179,301 @@ class AtcClient:
         timeout_s: float,
     ) -> None:
         self.base_url = base_url.rstrip("/")
+        self._url_register = f"{self.base_url}/v1/drones/register"
+        self._url_telemetry = f"{self.base_url}/v1/telemetry"
+        self._url_telemetry_batch = f"{self.base_url}/v1/telemetry:batch"
+        self._url_commands_next = f"{self.base_url}/v1/commands/next?{urlencode({'drone_id': drone_id})}"
+        self._url_commands_ack = f"{self.base_url}/v1/commands/ack"
         self.drone_id = drone_id
         self.owner_id = owner_id
         self.registration_token = registration_token
         self.session_token = session_token
         self.timeout_s = timeout_s
         self.http = requests.Session()
+        # Telemetry and command polls hit the same origin several times a second;
+        # keep a small pool of persistent connections so TCP/TLS setup is paid once.
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            pool_block=False,
+            max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=(502, 503, 504)),
+        )
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+        self.http.headers.update({"Connection": "keep-alive", "User-Agent": "atc-mavlink-gateway/1"})
         self.verify = False if tls_insecure else (ca_cert_path or True)
+        self._token_lock = threading.Lock()
+        self.auth = SessionTokenAuth(self)
+        # Telemetry is posted from a sender thread so HTTP latency never stalls MAVLink reads.
+        self._tx_q: queue.Queue[TelemetrySample] = queue.Queue(maxsize=8)
+        self._tx_thread: Optional[threading.Thread] = None
+        # The identity fields never change, so their JSON is encoded once and only the
+        # per-sample fields are serialized and spliced on.
+        identity: dict[str, object] = {"drone_id": drone_id}
+        if owner_id:
+            identity["owner_id"] = owner_id
+        self._json_prefix = orjson.dumps(identity)[:-1] + b","
+        self._payload: dict[str, object] = {
+            "lat": 0.0,
+            "lon": 0.0,
+            "altitude_m": 0.0,
+            "heading_deg": 0.0,
+            "speed_mps": 0.0,
+            "timestamp": "",
+        }
+        # Command polls and acks run on one worker so they stay ordered (an ack always lands
+        # before the next poll) without blocking the MAVLink loop.
+        self._cmd_exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="atc-commands")
+        self._batch_s = 0.0
+        self._batch_max = 1
+        # Cleared the first time the backend rejects the NDJSON batch endpoint.
+        self._batch_supported = True
+        self._keepalive_s = 0.0
+        self._last_sent_key: Optional[tuple[float, ...]] = None
+        self._last_sent_at = 0.0
 
     def ensure_session_token(self) -> str:
         if self.session_token:
             return self.session_token
+        with self._token_lock:
+            if self.session_token:
+                return self.session_token
+            return self._register()
+
+    def renew_session_token(self, rejected: str) -> str:
+        # The sender thread and the command worker can be rejected at the same time; only
+        # the first one re-registers, the other reuses the token it just minted.
+        with self._token_lock:
+            if self.session_token and self.session_token != rejected:
+                return self.session_token
+            self.session_token = ""
+            return self._register()
+
+    def _register(self) -> str:
         if not self.registration_token:
             raise RuntimeError("Set ATC_SESSION_TOKEN or ATC_REGISTRATION_TOKEN")
 
         payload: dict[str, object] = {"drone_id": self.drone_id}
         if self.owner_id:
             payload["owner_id"] = self.owner_id
+        body = orjson.dumps(payload)
 
         resp = self.http.post(
-            f"{self.base_url}/v1/drones/register",
-            headers={"X-Registration-Token": self.registration_token},
-            json=payload,
+            self._url_register,
+            headers={"X-Registration-Token": self.registration_token, "Content-Type": "application/json"},
+            data=body,
             timeout=self.timeout_s,
             verify=self.verify,
         )
         if resp.status_code != 201:
-            raise RuntimeError(f"register failed: {resp.status_code} {resp.text[:200]}")
+            raise RuntimeError(f"register failed: {resp.status_code} {body_excerpt(resp)}")
 
-        token = (resp.json() or {}).get("session_token")
+        token = (orjson.loads(resp.content) or {}).get("session_token")
         if not isinstance(token, str) or not token.strip():
             raise RuntimeError("register response missing session_token")
 
         self.session_token = token.strip()
         return self.session_token
 
-    def send_telemetry(self, state: TelemetryState) -> None:
-        token = self.ensure_session_token()
-
-        payload: dict[str, object] = {
-            "drone_id": self.drone_id,
-            "lat": float(state.lat),
-            "lon": float(state.lon),
-            "altitude_m": float(state.altitude_m),
-            "heading_deg": float(state.heading_deg or 0.0),
-            "speed_mps": float(state.speed_mps or 0.0),
-            "timestamp": now_rfc3339(),
-        }
-        if self.owner_id:
-            payload["owner_id"] = self.owner_id
+    def start_telemetry_sender(
+        self,
+        interval_s: float,
+        backoff_factor: float,
+        backoff_max_s: float,
+        jitter_factor: float,
+        batch_ms: float = 0.0,
+        batch_max: int = 1,
+        keepalive_s: float = 0.0,
+    ) -> None:
+        if self._tx_thread is not None:
+            return
+        self._keepalive_s = max(keepalive_s, 0.0)
+        self._batch_s = max(batch_ms, 0.0) / 1000.0
+        self._batch_max = max(batch_max, 1)
+        self._tx_thread = threading.Thread(
+            target=self._tx_loop,
+            args=(interval_s, backoff_factor, backoff_max_s, jitter_factor),
+            name="telemetry-tx",
+            daemon=True,
+        )
+        self._tx_thread.start()
 
+    def enqueue_telemetry(self, state: TelemetryState) -> None:
+        sample = state.snapshot()
+        try:
+            self._tx_q.put_nowait(sample)
+        except queue.Full:
+            # Newest sample wins: drop the oldest queued one rather than block the MAVLink loop.
+            try:
+                self._tx_q.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._tx_q.put_nowait(sample)
+            except queue.Full:
+                pass
+
+    def _tx_loop(self, interval_s: float, backoff_factor: float, backoff_max_s: float, jitter_factor: float) -> None:
+        backoff_s = interval_s
+        while True:
+            batch = self._drop_unchanged(self._collect_batch(self._tx_q.get()))
+            if not batch:
+                continue
+            try:
+                self._send_samples(batch)
+                self._last_sent_key = sample_key(batch[-1])
+                self._last_sent_at = time.monotonic()
+            except Exception as exc:  # noqa: BLE001
+                logging.warning("telemetry send failed: %s", exc)
+                backoff_s = max(interval_s, backoff_s) * max(backoff_factor, 1.0)
+                backoff_s = min(backoff_s, max(backoff_max_s, interval_s))
+                time.sleep(backoff_s * jitter_factor)
+            else:
+                backoff_s = interval_s
+
+    def _collect_batch(self, first: TelemetrySample) -> list[TelemetrySample]:
+        batch = [first]
+        if self._batch_s <= 0.0 or not self._batch_supported:
+            return batch
+        deadline = time.monotonic() + self._batch_s
+        while len(batch) < self._batch_max:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0.0:
+                break
+            try:
+                batch.append(self._tx_q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drop_unchanged(self, batch: list[TelemetrySample]) -> list[TelemetrySample]:
+        # A stationary vehicle produces identical samples; only resend them every keepalive_s.
+        if self._keepalive_s <= 0.0 or time.monotonic() - self._last_sent_at >= self._keepalive_s:
+            return batch
+        changed: list[TelemetrySample] = []
+        prev = self._last_sent_key
+        for sample in batch:
+            key = sample_key(sample)
+            if key != prev:
+                changed.append(sample)
+                prev = key
+        return changed
+
+    def _send_samples(self, batch: list[TelemetrySample]) -> None:
+        if len(batch) > 1 and self._batch_supported and self.send_telemetry_batch(batch):
+            return
+        for sample in batch:
+            self.send_telemetry(sample)
+
+    def _telemetry_body(self, sample: TelemetrySample) -> bytes:
+        # Only the sender thread calls this, so one dict is mutated in place instead of
+        # allocating per sample.
+        payload = self._payload
+        (
+            payload["lat"],
+            payload["lon"],
+            payload["altitude_m"],
+            payload["heading_deg"],
+            payload["speed_mps"],
+            payload["timestamp"],
+        ) = sample
+        return self._json_prefix + orjson.dumps(payload)[1:]
+
+    def send_telemetry_batch(self, batch: list[TelemetrySample]) -> bool:
+        """POST samples as NDJSON; returns False if the backend has no batch endpoint."""
+        body = b"\n".join(self._telemetry_body(sample) for sample in batch)
         resp = self.http.post(
-            f"{self.base_url}/v1/telemetry",
-            headers={"Authorization": f"Bearer {token}"},
-            json=payload,
+            self._url_telemetry_batch,
+            headers=NDJSON_HEADERS,
+            data=body,
+            auth=self.auth,
             timeout=self.timeout_s,
             verify=self.verify,
         )
 
-        if resp.status_code in (401, 403) and self.registration_token:
-            logging.warning("telemetry rejected (auth); re-registering token")
-            self.session_token = ""
-            token = self.ensure_session_token()
-            resp = self.http.post(
-                f"{self.base_url}/v1/telemetry",
-                headers={"Authorization": f"Bearer {token}"},
-                json=payload,
-                timeout=self.timeout_s,
-                verify=self.verify,
-            )
+        if resp.status_code in (404, 405, 415):
+            logging.info("telemetry batch endpoint unsupported (%s); sending samples individually", resp.status_code)
+            self._batch_supported = False
+            return False
+        if resp.status_code not in (200, 202):
+            raise RuntimeError(f"telemetry batch failed: {resp.status_code} {body_excerpt(resp)}")
+        return True
+
+    def send_telemetry(self, sample: TelemetrySample) -> None:
+        resp = self.http.post(
+            self._url_telemetry,
+            headers=JSON_HEADERS,
+            data=self._telemetry_body(sample),
+            auth=self.auth,
+            timeout=self.timeout_s,
+            verify=self.verify,
+        )
 
         if resp.status_code not in (200, 202):
-            raise RuntimeError(f"telemetry failed: {resp.status_code} {resp.text[:200]}")
+            raise RuntimeError(f"telemetry failed: {resp.status_code} {body_excerpt(resp)}")
 
     def get_next_command(self) -> Optional[dict]:
-        token = self.ensure_session_token()
         resp = self.http.get(
-            f"{self.base_url}/v1/commands/next",
-            params={"drone_id": self.drone_id},
-            headers={"Authorization": f"Bearer {token}"},
+            self._url_commands_next,
+            auth=self.auth,
             timeout=self.timeout_s,
             verify=self.verify,
         )
 
-        if resp.status_code in (401, 403) and self.registration_token:
-            logging.warning("commands rejected (auth); re-registering token")
-            self.session_token = ""
-            token = self.ensure_session_token()
-            resp = self.http.get(
-                f"{self.base_url}/v1/commands/next",
-                params={"drone_id": self.drone_id},
-                headers={"Authorization": f"Bearer {token}"},
-                timeout=self.timeout_s,
-                verify=self.verify,
-            )
-
         if resp.status_code != 200:
-            raise RuntimeError(f"command poll failed: {resp.status_code} {resp.text[:200]}")
+            raise RuntimeError(f"command poll failed: {resp.status_code} {body_excerpt(resp)}")
 
-        payload = resp.json()
+        payload = orjson.loads(resp.content)
         return payload if isinstance(payload, dict) else None
 
+    def poll_command_async(self) -> Future:
+        return self._cmd_exec.submit(self.get_next_command)
+
+    def ack_command_async(self, command_id: str) -> None:
+        def log_failure(fut: Future) -> None:
+            exc = fut.exception()
+            if exc is not None:
+                logging.warning("command ack failed (%s): %s", command_id, exc)
+
+        self._cmd_exec.submit(self.ack_command, command_id).add_done_callback(log_failure)
+
     def ack_command(self, command_id: str) -> None:
-        token = self.ensure_session_token()
         resp = self.http.post(
-            f"{self.base_url}/v1/commands/ack",
-            headers={"Authorization": f"Bearer {token}"},
-            json={"command_id": command_id},
+            self._url_commands_ack,
+            headers=JSON_HEADERS,
+            data=orjson.dumps({"command_id": command_id}),
+            auth=self.auth,
             timeout=self.timeout_s,
             verify=self.verify,
         )
 
-        if resp.status_code in (401, 403) and self.registration_token:
-            logging.warning("command ack rejected (auth); re-registering token")
-            self.session_token = ""
-            token = self.ensure_session_token()
-            resp = self.http.post(
-                f"{self.base_url}/v1/commands/ack",
-                headers={"Authorization": f"Bearer {token}"},
-                json={"command_id": command_id},
-                timeout=self.timeout_s,
-                verify=self.verify,
-            )
-
         if resp.status_code not in (200, 201):
-            raise RuntimeError(f"command ack failed: {resp.status_code} {resp.text[:200]}")
+            raise RuntimeError(f"command ack failed: {resp.status_code} {body_excerpt(resp)}")
 
 
 def parse_global_position_int(msg, state: TelemetryState) -> None:
+    # GLOBAL_POSITION_INT always carries these integer fields (degE7, mm, cdeg, cm/s).
     try:
-        state.lat = float(msg.lat) / 1e7
-        state.lon = float(msg.lon) / 1e7
-        state.altitude_m = float(msg.alt) / 1000.0
-
-        if getattr(msg, "hdg", None) not in (None, 65535):
-            state.heading_deg = float(msg.hdg) / 100.0
-
-        vx = getattr(msg, "vx", None)
-        vy = getattr(msg, "vy", None)
-        if vx is not None and vy is not None:
-            speed = math.sqrt(float(vx) ** 2 + float(vy) ** 2) / 100.0
-            if math.isfinite(speed):
-                state.speed_mps = speed
+        state.lat = msg.lat * 1e-7
+        state.lon = msg.lon * 1e-7
+        state.altitude_m = msg.alt * 1e-3
+
+        hdg = msg.hdg
+        if hdg != 65535:
+            state.heading_deg = hdg * 0.01
+
+        state.speed_mps = math.hypot(msg.vx, msg.vy) * 0.01
     except Exception as exc:  # noqa: BLE001
         logging.debug("failed to parse GLOBAL_POSITION_INT: %s", exc)
 
 
 def parse_vfr_hud(msg, state: TelemetryState) -> None:
+    # VFR_HUD always carries heading (int16 deg) and groundspeed (float m/s).
     try:
-        heading = getattr(msg, "heading", None)
-        if heading is not None and math.isfinite(float(heading)):
-            state.heading_deg = float(heading)
+        state.heading_deg = float(msg.heading)
 
-        groundspeed = getattr(msg, "groundspeed", None)
-        if groundspeed is not None and math.isfinite(float(groundspeed)):
+        groundspeed = msg.groundspeed
+        if math.isfinite(groundspeed):
             state.speed_mps = float(groundspeed)
     except Exception as exc:  # noqa: BLE001
         logging.debug("failed to parse VFR_HUD: %s", exc)
@@ -260,20 +489,65 @@ def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return 2.0 * r * math.atan2(math.sqrt(a), math.sqrt(1.0 - a))
 
 
-def pick_mode(mapping: dict, candidates: list[str]) -> Optional[str]:
-    if not mapping:
-        return None
-    normalized = {str(name).upper(): str(name) for name in mapping.keys()}
+POSITION_TARGET_TYPE_MASK = (
+    mavutil.mavlink.POSITION_TARGET_TYPEMASK_VX_IGNORE
+    | mavutil.mavlink.POSITION_TARGET_TYPEMASK_VY_IGNORE
+    | mavutil.mavlink.POSITION_TARGET_TYPEMASK_VZ_IGNORE
+    | mavutil.mavlink.POSITION_TARGET_TYPEMASK_AX_IGNORE
+    | mavutil.mavlink.POSITION_TARGET_TYPEMASK_AY_IGNORE
+    | mavutil.mavlink.POSITION_TARGET_TYPEMASK_AZ_IGNORE
+    | mavutil.mavlink.POSITION_TARGET_TYPEMASK_YAW_IGNORE
+    | mavutil.mavlink.POSITION_TARGET_TYPEMASK_YAW_RATE_IGNORE
+)
+
+# (id(mav), mav_type) -> (mode mapping, upper-case name -> mapping key). The mapping only
+# changes with the vehicle type reported in HEARTBEAT, so it is rebuilt when that changes.
+_mode_cache: dict[tuple[int, object], tuple[dict, dict[str, str]]] = {}
+
+
+def mode_index(mav) -> tuple[dict, dict[str, str]]:
+    key = (id(mav), getattr(mav, "mav_type", None))
+    cached = _mode_cache.get(key)
+    if cached is None:
+        mapping = mav.mode_mapping() or {}
+        cached = (mapping, {str(name).upper(): str(name) for name in mapping.keys()})
+        if mapping:
+            _mode_cache[key] = cached
+    return cached
+
+
+# Same mean Earth radius as haversine_m so both agree at short range.
+METERS_PER_DEGREE = math.radians(1.0) * 6371000.0
+
+
+def near_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Equirectangular distance; accurate to well under a metre over waypoint-acceptance ranges."""
+    x = (lon2 - lon1) * math.cos(math.radians(lat1)) * METERS_PER_DEGREE
+    y = (lat2 - lat1) * METERS_PER_DEGREE
+    return math.hypot(x, y)
+
+
+def normalize_modes(*names: str) -> tuple[str, ...]:
+    return tuple(name.strip().upper() for name in names)
+
+
+# Candidate lists are normalized once so lookups against the upper-cased mode index are plain gets.
+HOLD_MODES = normalize_modes("LOITER", "HOLD", "POSHOLD", "BRAKE", "ALT_HOLD")
+GUIDED_MODES = normalize_modes("GUIDED", "OFFBOARD")
+RESUME_TARGET_MODES = normalize_modes("GUIDED", "OFFBOARD", "AUTO")
+
+
+def pick_mode_normalized(normalized: dict[str, str], candidates: tuple[str, ...]) -> Optional[str]:
     for candidate in candidates:
-        key = candidate.strip().upper()
-        if key in normalized:
-            return normalized[key]
+        mode_name = normalized.get(candidate)
+        if mode_name is not None:
+            return mode_name
     return None
 
 
-def set_mode_any(mav, candidates: list[str]) -> Optional[str]:
-    mapping = mav.mode_mapping() or {}
-    mode_name = pick_mode(mapping, candidates)
+def set_mode_any(mav, candidates: tuple[str, ...]) -> Optional[str]:
+    mapping, normalized = mode_index(mav)
+    mode_name = pick_mode_normalized(normalized, candidates)
     if not mode_name:
         return None
     mode_id = mapping[mode_name]
@@ -289,23 +563,12 @@ def send_position_target(mav, lat: float, lon: float, altitude_m: float) -> None
     lat_int = int(lat * 1e7)
     lon_int = int(lon * 1e7)
 
-    type_mask = (
-        mavutil.mavlink.POSITION_TARGET_TYPEMASK_VX_IGNORE
-        | mavutil.mavlink.POSITION_TARGET_TYPEMASK_VY_IGNORE
-        | mavutil.mavlink.POSITION_TARGET_TYPEMASK_VZ_IGNORE
-        | mavutil.mavlink.POSITION_TARGET_TYPEMASK_AX_IGNORE
-        | mavutil.mavlink.POSITION_TARGET_TYPEMASK_AY_IGNORE
-        | mavutil.mavlink.POSITION_TARGET_TYPEMASK_AZ_IGNORE
-        | mavutil.mavlink.POSITION_TARGET_TYPEMASK_YAW_IGNORE
-        | mavutil.mavlink.POSITION_TARGET_TYPEMASK_YAW_RATE_IGNORE
-    )
-
     mav.mav.set_position_target_global_int_send(
         0,
         mav.target_system,
         mav.target_component,
         mavutil.mavlink.MAV_FRAME_GLOBAL_INT,
-        type_mask,
+        POSITION_TARGET_TYPE_MASK,
         lat_int,
         lon_int,
         float(altitude_m),
@@ -320,6 +583,99 @@ def send_position_target(mav, lat: float, lon: float, altitude_m: float) -> None
     )
 
 
+def handle_hold(kind: str, command_type: dict, mav, telemetry: TelemetryState, commands: CommandState, now: float) -> bool:
+    duration = int(command_type.get("duration_secs") or 0)
+    if not commands.previous_mode:
+        commands.previous_mode = commands.current_mode
+    commands.hold_until = now + max(duration, 0)
+    hold_mode = set_mode_any(mav, HOLD_MODES)
+    if hold_mode:
+        logging.info("HOLD -> mode %s (duration=%ss)", hold_mode, duration)
+        return True
+    logging.warning("HOLD requested but no compatible mode was found")
+    return False
+
+
+def handle_resume(kind: str, command_type: dict, mav, telemetry: TelemetryState, commands: CommandState, now: float) -> bool:
+    commands.hold_until = None
+    resume_mode = commands.previous_mode
+    commands.previous_mode = ""
+    if resume_mode:
+        set_mode_any(mav, normalize_modes(resume_mode))
+        logging.info("RESUME -> mode %s", resume_mode)
+    elif commands.active_target:
+        resumed = set_mode_any(mav, RESUME_TARGET_MODES)
+        logging.info("RESUME -> mode %s", resumed or "(unchanged)")
+    return True
+
+
+def handle_altitude_change(
+    kind: str, command_type: dict, mav, telemetry: TelemetryState, commands: CommandState, now: float
+) -> bool:
+    if not telemetry.ready():
+        logging.warning("ALTITUDE_CHANGE received but telemetry is not ready")
+        return False
+    target_alt = float(command_type.get("target_altitude_m"))
+    set_mode_any(mav, GUIDED_MODES)
+    commands.active_target = (telemetry.lat, telemetry.lon, target_alt)
+    commands.reroute_queue = []
+    logging.info("ALTITUDE_CHANGE -> %.1fm", target_alt)
+    return True
+
+
+def handle_reroute(kind: str, command_type: dict, mav, telemetry: TelemetryState, commands: CommandState, now: float) -> bool:
+    raw = command_type.get("waypoints") or []
+    waypoints: list[tuple[float, float, float]] = []
+    for wp in raw:
+        if not isinstance(wp, dict):
+            continue
+        lat = float(wp.get("lat"))
+        lon = float(wp.get("lon"))
+        alt = float(wp.get("altitude_m"))
+        waypoints.append((lat, lon, alt))
+    if not waypoints:
+        logging.warning("REROUTE received but no waypoints provided")
+        return False
+    set_mode_any(mav, GUIDED_MODES)
+    commands.active_target = waypoints[0]
+    commands.reroute_queue = waypoints[1:]
+    logging.info("REROUTE -> %s waypoint(s)", len(waypoints))
+    return True
+
+
+def handle_unsupported(
+    kind: str, command_type: dict, mav, telemetry: TelemetryState, commands: CommandState, now: float
+) -> bool:
+    logging.warning("unsupported command type: %s", kind or "(missing)")
+    return False
+
+
+# Upper-cased ATC command type -> handler; each returns True when the command should be acked.
+COMMAND_HANDLERS = {
+    "HOLD": handle_hold,
+    "RESUME": handle_resume,
+    "ALTITUDE_CHANGE": handle_altitude_change,
+    "REROUTE": handle_reroute,
+}
+
+
+# recv_match() only accepts a list or set here (anything else is wrapped as a single type name).
+HANDLED_MESSAGE_TYPES = {"GLOBAL_POSITION_INT", "VFR_HUD", "HEARTBEAT"}
+
+
+def handle_message(mav, msg, telemetry: TelemetryState, commands: CommandState) -> None:
+    msg_type = msg.get_type()
+    if msg_type == "GLOBAL_POSITION_INT":
+        parse_global_position_int(msg, telemetry)
+    elif msg_type == "VFR_HUD":
+        parse_vfr_hud(msg, telemetry)
+    elif msg_type == "HEARTBEAT":
+        try:
+            commands.current_mode = mav.flightmode or commands.current_mode
+        except Exception:  # noqa: BLE001
+            pass
+
+
 def main() -> int:
     logging.basicConfig(
         level=os.environ.get("LOG_LEVEL", "INFO").upper(),
@@ -346,6 +702,9 @@ def main() -> int:
     backoff_jitter_pct = env_float("ATC_BACKOFF_JITTER_PCT", 0.15)
     command_poll_backoff_max_s = env_float("ATC_COMMAND_POLL_BACKOFF_MAX_S", 30.0)
     telemetry_backoff_max_s = env_float("ATC_TELEMETRY_BACKOFF_MAX_S", 30.0)
+    telemetry_batch_ms = env_float("ATC_TELEMETRY_BATCH_MS", 0.0)
+    telemetry_batch_max = int(env_float("ATC_TELEMETRY_BATCH_MAX", 10))
+    telemetry_keepalive_s = env_float("ATC_TELEMETRY_KEEPALIVE_S", 5.0)
 
     setpoint_interval_s = 1.0 / telemetry_hz if telemetry_hz > 0 else 0.2
     command_poll_interval_s = 1.0 / command_poll_hz if command_poll_hz > 0 else 1.0
@@ -384,39 +743,63 @@ def main() -> int:
     next_setpoint_send = 0.0
     next_telemetry_send = 0.0
     poll_backoff_s = command_poll_interval_s
-    telemetry_backoff_s = setpoint_interval_s
+    poll_future: Optional[Future] = None
+    atc.start_telemetry_sender(
+        setpoint_interval_s,
+        backoff_factor,
+        telemetry_backoff_max_s,
+        jitter_factor,
+        batch_ms=telemetry_batch_ms,
+        batch_max=telemetry_batch_max,
+        keepalive_s=telemetry_keepalive_s,
+    )
 
     while True:
-        msg = mav.recv_match(blocking=True, timeout=1.0)
-        if msg is not None:
-            msg_type = msg.get_type()
-            if msg_type == "GLOBAL_POSITION_INT":
-                parse_global_position_int(msg, telemetry)
-            elif msg_type == "VFR_HUD":
-                parse_vfr_hud(msg, telemetry)
-            elif msg_type == "HEARTBEAT":
-                try:
-                    commands.current_mode = mav.flightmode or commands.current_mode
-                except Exception:  # noqa: BLE001
-                    pass
+        # Sleep only until the next scheduled action (capped at 1s), then drain every
+        # MAVLink message that arrived in the meantime.
+        # While a poll is in flight, check back shortly for its result.
+        poll_deadline = next_poll if poll_future is None else time.monotonic() + 0.05
+        deadline = min(poll_deadline, next_setpoint_send, next_telemetry_send)
+        if commands.hold_until is not None:
+            deadline = min(deadline, commands.hold_until)
+        wait_s = min(max(deadline - time.monotonic(), 0.0), 1.0)
+        fd = getattr(mav, "fd", None)
+        if fd is None:
+            msg = mav.recv_match(type=HANDLED_MESSAGE_TYPES, blocking=True, timeout=wait_s)
+            if msg is not None:
+                handle_message(mav, msg, telemetry, commands)
+        else:
+            try:
+                select.select([fd], [], [], wait_s)
+            except (OSError, ValueError):
+                # Link is reconnecting; recv_match below handles the reopen.
+                pass
+        while True:
+            msg = mav.recv_match(type=HANDLED_MESSAGE_TYPES, blocking=False)
+            if msg is None:
+                break
+            handle_message(mav, msg, telemetry, commands)
 
         now = time.monotonic()
 
         if commands.hold_until is not None and now >= commands.hold_until:
             commands.hold_until = None
             if commands.active_target:
-                resumed = set_mode_any(mav, ["GUIDED", "OFFBOARD", "AUTO"])
+                resumed = set_mode_any(mav, RESUME_TARGET_MODES)
                 if resumed:
                     logging.info("auto-resume to %s (hold expired)", resumed)
             elif commands.previous_mode:
-                resumed = set_mode_any(mav, [commands.previous_mode])
+                resumed = set_mode_any(mav, normalize_modes(commands.previous_mode))
                 if resumed:
                     logging.info("auto-resume to %s (hold expired)", resumed)
             commands.previous_mode = ""
 
-        if now >= next_poll:
+        if poll_future is None and now >= next_poll:
+            poll_future = atc.poll_command_async()
+
+        if poll_future is not None and poll_future.done():
             try:
-                cmd = atc.get_next_command()
+                cmd = poll_future.result()
             except Exception as exc:  # noqa: BLE001
                 logging.debug("command poll failed: %s", exc)
                 cmd = None
@@ -426,89 +809,27 @@ def main() -> int:
             else:
                 poll_backoff_s = command_poll_interval_s
                 next_poll = now + command_poll_interval_s
+            poll_future = None
 
             if isinstance(cmd, dict) and cmd.get("command_id"):
                 command_id = str(cmd.get("command_id"))
                 expires_at = parse_rfc3339(cmd.get("expires_at"))
                 if expires_at is not None and expires_at <= datetime.now(timezone.utc):
                     logging.info("skipping expired command %s (expires_at=%s)", command_id, cmd.get("expires_at"))
-                    try:
-                        atc.ack_command(command_id)
-                    except Exception as exc:  # noqa: BLE001
-                        logging.warning("command ack failed (%s): %s", command_id, exc)
+                    atc.ack_command_async(command_id)
                     continue
 
                 command_type = cmd.get("command_type") or {}
                 kind = str(command_type.get("type") or "").upper()
-                handled = False
 
                 try:
-                    if kind == "HOLD":
-                        duration = int(command_type.get("duration_secs") or 0)
-                        if not commands.previous_mode:
-                            commands.previous_mode = commands.current_mode
-                        commands.hold_until = now + max(duration, 0)
-                        hold_mode = set_mode_any(mav, ["LOITER", "HOLD", "POSHOLD", "BRAKE", "ALT_HOLD"])
-                        if hold_mode:
-                            logging.info("HOLD -> mode %s (duration=%ss)", hold_mode, duration)
-                            handled = True
-                        else:
-                            logging.warning("HOLD requested but no compatible mode was found")
-
-                    elif kind == "RESUME":
-                        commands.hold_until = None
-                        resume_mode = commands.previous_mode
-                        commands.previous_mode = ""
-                        if resume_mode:
-                            set_mode_any(mav, [resume_mode])
-                            logging.info("RESUME -> mode %s", resume_mode)
-                        elif commands.active_target:
-                            resumed = set_mode_any(mav, ["GUIDED", "OFFBOARD", "AUTO"])
-                            logging.info("RESUME -> mode %s", resumed or "(unchanged)")
-                        handled = True
-
-                    elif kind == "ALTITUDE_CHANGE":
-                        if telemetry.ready():
-                            target_alt = float(command_type.get("target_altitude_m"))
-                            set_mode_any(mav, ["GUIDED", "OFFBOARD"])
-                            commands.active_target = (float(telemetry.lat), float(telemetry.lon), target_alt)
-                            commands.reroute_queue = []
-                            logging.info("ALTITUDE_CHANGE -> %.1fm", target_alt)
-                            handled = True
-                        else:
-                            logging.warning("ALTITUDE_CHANGE received but telemetry is not ready")
-
-                    elif kind == "REROUTE":
-                        raw = command_type.get("waypoints") or []
-                        waypoints: list[tuple[float, float, float]] = []
-                        for wp in raw:
-                            if not isinstance(wp, dict):
-                                continue
-                            lat = float(wp.get("lat"))
-                            lon = float(wp.get("lon"))
-                            alt = float(wp.get("altitude_m"))
-                            waypoints.append((lat, lon, alt))
-                        if waypoints:
-                            set_mode_any(mav, ["GUIDED", "OFFBOARD"])
-                            commands.active_target = waypoints[0]
-                            commands.reroute_queue = waypoints[1:]
-                            logging.info("REROUTE -> %s waypoint(s)", len(waypoints))
-                            handled = True
-                        else:
-                            logging.warning("REROUTE received but no waypoints provided")
-
-                    else:
-                        logging.warning("unsupported command type: %s", kind or "(missing)")
-
+                    handled = COMMAND_HANDLERS.get(kind, handle_unsupported)(kind, command_type, mav, telemetry, commands, now)
                 except Exception as exc:  # noqa: BLE001
                     logging.warning("command handler error (%s): %s", kind, exc)
                     handled = False
 
                 if handled:
-                    try:
-                        atc.ack_command(command_id)
-                    except Exception as exc:  # noqa: BLE001
-                        logging.warning("command ack failed (%s): %s", command_id, exc)
+                    atc.ack_command_async(command_id)
 
         if now >= next_setpoint_send:
             next_setpoint_send = now + setpoint_interval_s
@@ -518,9 +839,9 @@ def main() -> int:
                 except Exception as exc:  # noqa: BLE001
                     logging.debug("failed to send setpoint: %s", exc)
 
-                dist = haversine_m(
-                    float(telemetry.lat),
-                    float(telemetry.lon),
+                dist = near_m(
+                    telemetry.lat,
+                    telemetry.lon,
                     commands.active_target[0],
                     commands.active_target[1],
                 )
@@ -538,15 +859,7 @@ def main() -> int:
         if not telemetry.ready():
             continue
 
-        try:
-            atc.send_telemetry(telemetry)
-        except Exception as exc:  # noqa: BLE001
-            logging.warning("telemetry send failed: %s", exc)
-            telemetry_backoff_s = max(setpoint_interval_s, telemetry_backoff_s) * max(backoff_factor, 1.0)
-            telemetry_backoff_s = min(telemetry_backoff_s, max(telemetry_backoff_max_s, setpoint_interval_s))
-            next_telemetry_send = now + (telemetry_backoff_s * jitter_factor)
-        else:
-            telemetry_backoff_s = setpoint_interval_s
+        atc.enqueue_telemetry(telemetry)
 
 
 if __name__ == "__main__":
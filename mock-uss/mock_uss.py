@@ -2,13 +2,19 @@
 import json
 import math
 import os
+import threading
 import time
 import uuid
 from datetime import datetime, timedelta, timezone
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from urllib.parse import parse_qs, urlparse, urlencode
 from urllib.request import Request, urlopen
 
+try:
+    import orjson  # optional; the stock python image runs on the json fallback
+except ImportError:
+    orjson = None
+
 
 HOST = "0.0.0.0"
 PORT = int(os.getenv("MOCK_USS_PORT", "9100"))
@@ -45,12 +51,20 @@ FLIGHT_SEEDS = [
 ]
 
 
+# [epoch second, formatted string]; timestamps are second-resolution, so format once per second.
+ISO_NOW_CACHE = [-1, ""]
+
+
 def iso_now():
-    return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+    now = int(time.time())
+    if now != ISO_NOW_CACHE[0]:
+        ISO_NOW_CACHE[:] = [now, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now))]
+    return ISO_NOW_CACHE[1]
 
 
-def make_position(seed):
-    t = time.time() / 60.0
+def make_position(seed, t=None):
+    if t is None:
+        t = time.time() / 60.0
     wobble = 0.002
     lat = seed["lat"] + wobble * math.sin(t + seed["phase"])
     lng = seed["lng"] + wobble * math.cos(t + seed["phase"])
@@ -90,6 +104,33 @@ def build_flight(seed):
     }
 
 
+# Flight documents are built once; each request only refreshes the moving fields.
+# Requests are served concurrently, so refresh + serialize happens under FLIGHTS_LOCK.
+FLIGHT_TEMPLATES = [build_flight(seed) for seed in FLIGHT_SEEDS]
+FLIGHTS_LOCK = threading.Lock()
+
+
+def refresh_flights(view=None):
+    # One clock read and one timestamp for the whole snapshot, shared by every seed.
+    # The view filter runs on the raw positions so out-of-view flights are never touched.
+    t = time.time() / 60.0
+    timestamp = iso_now()
+    flights = []
+    for flight, seed in zip(FLIGHT_TEMPLATES, FLIGHT_SEEDS):
+        lat, lng, alt = make_position(seed, t)
+        if view and not in_view(view, lat, lng):
+            continue
+        current_state = flight["current_state"]
+        current_state["timestamp"]["value"] = timestamp
+        position = current_state["position"]
+        position["lat"] = lat
+        position["lng"] = lng
+        position["alt"] = alt
+        position["pressure_altitude"] = alt
+        flights.append(flight)
+    return flights
+
+
 def parse_view(view_str):
     try:
         parts = [float(v) for v in view_str.split(",")]
@@ -100,16 +141,9 @@ def parse_view(view_str):
         return None
 
 
-def filter_flights_by_view(flights, view):
-    if not view:
-        return flights
+def in_view(view, lat, lng):
     min_lat, min_lng, max_lat, max_lng = view
-    filtered = []
-    for flight in flights:
-        pos = flight["current_state"]["position"]
-        if min_lat <= pos["lat"] <= max_lat and min_lng <= pos["lng"] <= max_lng:
-            filtered.append(flight)
-    return filtered
+    return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
 
 
 def request_token():
@@ -125,6 +159,12 @@ def request_token():
     return payload.get("access_token")
 
 
+def json_body(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode("utf-8")
+
+
 def register_isa():
     token = request_token()
     if not token:
@@ -164,7 +204,7 @@ def register_isa():
     req = Request(
         url,
         method="PUT",
-        data=json.dumps(payload).encode("utf-8"),
+        data=json_body(payload),
         headers={
             "Content-Type": "application/json",
             "Authorization": f"Bearer {token}",
@@ -175,9 +215,41 @@ def register_isa():
         return resp.status, body
 
 
+def build_details(seed):
+    flight_id = seed["id"]
+    return {
+        "details": {
+            "id": flight_id,
+            "operation_description": "Mock USS demo flight",
+            "operator_id": "mock-operator",
+            "operator_location": {
+                "position": {"lat": seed["lat"], "lng": seed["lng"]}
+            },
+            "uas_id": {
+                "serial_number": f"MOCK-{flight_id}",
+                "registration_id": "MOCK-REG-001",
+                "utm_id": "MOCK-UTM-001",
+            },
+        }
+    }
+
+
+# Responses that never change are encoded once at import.
+ROOT_BODY = json_body(
+    {
+        "service": "mock-uss",
+        "base_url": MOCK_USS_BASE_URL,
+        "dss_base_url": DSS_BASE_URL,
+    }
+)
+HEALTH_BODY = json_body({"status": "ok"})
+NOT_FOUND_BODY = json_body({"message": "Not found"})
+FLIGHT_NOT_FOUND_BODY = json_body({"message": "Flight not found"})
+FLIGHT_DETAILS_BODIES = {seed["id"]: json_body(build_details(seed)) for seed in FLIGHT_SEEDS}
+
+
 class MockUSSHandler(BaseHTTPRequestHandler):
-    def _send_json(self, status, payload):
-        body = json.dumps(payload).encode("utf-8")
+    def _send_body(self, status, body):
         self.send_response(status)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(body)))
@@ -192,18 +264,11 @@ class MockUSSHandler(BaseHTTPRequestHandler):
         path = parsed.path.rstrip("/")
 
         if path == "" or path == "/":
-            self._send_json(
-                200,
-                {
-                    "service": "mock-uss",
-                    "base_url": MOCK_USS_BASE_URL,
-                    "dss_base_url": DSS_BASE_URL,
-                },
-            )
+            self._send_body(200, ROOT_BODY)
             return
 
         if path == "/health":
-            self._send_json(200, {"status": "ok"})
+            self._send_body(200, HEALTH_BODY)
             return
 
         if path == "/uss/flights":
@@ -211,13 +276,13 @@ class MockUSSHandler(BaseHTTPRequestHandler):
             view_raw = query.get("view", [None])[0]
             view = parse_view(view_raw) if view_raw else None
 
-            flights = [build_flight(seed) for seed in FLIGHT_SEEDS]
-            flights = filter_flights_by_view(flights, view)
-            response = {
-                "timestamp": {"value": iso_now(), "format": "RFC3339"},
-                "flights": flights,
-            }
-            self._send_json(200, response)
+            with FLIGHTS_LOCK:
+                response = {
+                    "timestamp": {"value": iso_now(), "format": "RFC3339"},
+                    "flights": refresh_flights(view),
+                }
+                body = json_body(response)
+            self._send_body(200, body)
             return
 
         if path.startswith("/uss/flights/") and path.endswith("/details"):
@@ -225,33 +290,17 @@ class MockUSSHandler(BaseHTTPRequestHandler):
             if len(parts) >= 4:
                 flight_id = parts[3]
             else:
-                self._send_json(404, {"message": "Not found"})
+                self._send_body(404, NOT_FOUND_BODY)
                 return
 
-            matching = next((seed for seed in FLIGHT_SEEDS if seed["id"] == flight_id), None)
-            if not matching:
-                self._send_json(404, {"message": "Flight not found"})
+            details = FLIGHT_DETAILS_BODIES.get(flight_id)
+            if details is None:
+                self._send_body(404, FLIGHT_NOT_FOUND_BODY)
                 return
-
-            details = {
-                "details": {
-                    "id": flight_id,
-                    "operation_description": "Mock USS demo flight",
-                    "operator_id": "mock-operator",
-                    "operator_location": {
-                        "position": {"lat": matching["lat"], "lng": matching["lng"]}
-                    },
-                    "uas_id": {
-                        "serial_number": f"MOCK-{flight_id}",
-                        "registration_id": "MOCK-REG-001",
-                        "utm_id": "MOCK-UTM-001",
-                    },
-                }
-            }
-            self._send_json(200, details)
+            self._send_body(200, details)
             return
 
-        self._send_json(404, {"message": "Not found"})
+        self._send_body(404, NOT_FOUND_BODY)
 
 
 def main():
@@ -263,7 +312,7 @@ def main():
     except Exception as exc:
         print(f"[mock-uss] ISA registration failed: {exc}")
 
-    server = HTTPServer((HOST, PORT), MockUSSHandler)
+    server = ThreadingHTTPServer((HOST, PORT), MockUSSHandler)
     print(f"[mock-uss] listening on {HOST}:{PORT}")
     server.serve_forever()
 
@@ -1,17 +1,26 @@
 import math
 import os
-from functools import lru_cache
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from typing import Dict, List, Optional, Tuple
 
+# GDAL reads its block cache size from the environment; set it before rasterio loads GDAL.
+os.environ.setdefault("GDAL_CACHEMAX", os.getenv("TERRAIN_GDAL_CACHEMAX_MB", "512"))
+
 import numpy as np
 import rasterio
+from rasterio.transform import rowcol
+from rasterio.windows import Window
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 
 DATA_DIR = os.getenv("TERRAIN_DATA_DIR", "/data/terrain")
-CACHE_SIZE = int(os.getenv("TERRAIN_CACHE_SIZE", "8"))
-
-app = FastAPI()
+CACHE_SIZE = int(os.getenv("TERRAIN_CACHE_SIZE", "256"))
+PREWARM_TILES = int(os.getenv("TERRAIN_PREWARM_TILES", "16"))
+WINDOW_MAX_PIXELS = int(os.getenv("TERRAIN_WINDOW_MAX_PIXELS", str(2048 * 2048)))
+SAMPLE_WORKERS = int(os.getenv("TERRAIN_SAMPLE_WORKERS", "8"))
 
 
 def parse_list(value: str) -> List[float]:
@@ -22,37 +31,141 @@ def parse_list(value: str) -> List[float]:
 
 def tile_key(lat: float, lon: float) -> str:
     # Copernicus 1x1 degree tiles are named by the SW corner.
-    lat_floor = math.floor(lat)
-    lon_floor = math.floor(lon)
+    return tile_key_from_floor(math.floor(lat), math.floor(lon))
+
+
+def tile_key_from_floor(lat_floor: int, lon_floor: int) -> str:
     ns = "N" if lat_floor >= 0 else "S"
     ew = "E" if lon_floor >= 0 else "W"
     return f"{ns}{abs(lat_floor):02d}_00_{ew}{abs(lon_floor):03d}_00"
 
 
+def tile_id_to_floor(tile_id: int) -> Tuple[int, int]:
+    # Inverse of the packing in elevation_from_lists: (lat_floor + 90) * 360 + (lon_floor + 180).
+    lat_off, lon_off = divmod(tile_id, 360)
+    return lat_off - 90, lon_off - 180
+
+
 def tile_path(key: str) -> str:
     name = f"Copernicus_DSM_COG_10_{key}_DEM"
     return os.path.join(DATA_DIR, f"{name}.tif")
 
 
-@lru_cache(maxsize=CACHE_SIZE)
-def open_dataset(path: str) -> rasterio.DatasetReader:
-    return rasterio.open(path)
+# tile id -> (dataset, lock), most recently used last. DatasetReader is not safe for
+# concurrent reads, so each one carries its own lock.
+_datasets: "OrderedDict[int, Tuple[rasterio.DatasetReader, threading.Lock]]" = OrderedDict()
+_datasets_lock = threading.Lock()
+_sample_pool = ThreadPoolExecutor(max_workers=max(SAMPLE_WORKERS, 1), thread_name_prefix="terrain-sample")
+
+
+def open_dataset(tile_id: int, path: str) -> Tuple[rasterio.DatasetReader, threading.Lock]:
+    with _datasets_lock:
+        entry = _datasets.get(tile_id)
+        if entry is not None:
+            _datasets.move_to_end(tile_id)
+            return entry
+    # Open outside the cache lock so a slow open (cold page cache, network mount) does not
+    # stall lookups of tiles that are already open.
+    dataset = rasterio.open(path)
+    with _datasets_lock:
+        entry = _datasets.get(tile_id)
+        if entry is not None:
+            # Another thread opened the same tile first; keep its reader.
+            _datasets.move_to_end(tile_id)
+            dataset.close()
+            return entry
+        entry = (dataset, threading.Lock())
+        _datasets[tile_id] = entry
+        while len(_datasets) > max(CACHE_SIZE, 1):
+            # Not closed explicitly: a request may still hold the evicted reader, and
+            # rasterio releases the GDAL handle once the last reference goes away.
+            _datasets.popitem(last=False)
+        return entry
+
+
+def tile_id_from_name(name: str) -> Optional[int]:
+    # Copernicus_DSM_COG_10_N33_00_W118_00_DEM.tif
+    if not (name.startswith("Copernicus_DSM_COG_10_") and name.endswith("_DEM.tif")):
+        return None
+    try:
+        lat = int(name[23:25])
+        lon = int(name[30:33])
+    except ValueError:
+        return None
+    lat = lat if name[22] == "N" else -lat
+    lon = lon if name[29] == "E" else -lon
+    return (lat + 90) * 360 + (lon + 180)
+
+
+def prewarm_datasets(limit: int) -> None:
+    """Open the most recently modified tiles so the first requests skip GDAL open."""
+    if limit <= 0:
+        return
+    candidates: List[Tuple[float, int, str]] = []
+    try:
+        with os.scandir(DATA_DIR) as entries:
+            for entry in entries:
+                tile_id = tile_id_from_name(entry.name)
+                if tile_id is not None and entry.is_file():
+                    candidates.append((entry.stat().st_mtime, tile_id, entry.path))
+    except OSError:
+        return
+    candidates.sort(reverse=True)
+    for _, tile_id, path in candidates[: min(limit, CACHE_SIZE)]:
+        try:
+            open_dataset(tile_id, path)
+        except rasterio.RasterioIOError:
+            continue
+
 
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    prewarm_datasets(PREWARM_TILES)
+    yield
 
-def sample_tile(path: str, points: List[Tuple[float, float]]) -> List[float]:
-    dataset = open_dataset(path)
+
+app = FastAPI(lifespan=lifespan)
+
+
+def sample_tile(tile_id: int, path: str, lons: np.ndarray, lats: np.ndarray) -> List[Optional[float]]:
+    dataset, lock = open_dataset(tile_id, path)
     nodata = dataset.nodata
-    samples = dataset.sample(points)
-    values: List[Optional[float]] = []
-    for sample in samples:
-        value = float(sample[0])
-        if nodata is not None and value == nodata:
-            values.append(None)
-            continue
-        if not np.isfinite(value):
-            values.append(None)
-            continue
-        values.append(value)
+    rows, cols = rowcol(dataset.transform, lons, lats)
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+
+    # Same convention as dataset.sample(): pixels off the raster read as nodata (or 0).
+    vals = np.full(len(lons), nodata or 0, dtype=np.float64)
+    inside = (rows >= 0) & (cols >= 0) & (rows < dataset.height) & (cols < dataset.width)
+    if inside.any():
+        r = rows[inside]
+        c = cols[inside]
+        r0 = int(r.min())
+        c0 = int(c.min())
+        height = int(r.max()) - r0 + 1
+        width = int(c.max()) - c0 + 1
+        if height * width <= WINDOW_MAX_PIXELS:
+            # One read covering every requested pixel instead of a 1x1 read per point.
+            with lock:
+                window = dataset.read(1, window=Window(c0, r0, width, height))
+            vals[inside] = window[r - r0, c - c0]
+        else:
+            # Widely scattered points: a covering window would pull most of the tile.
+            points = zip(lons[inside].tolist(), lats[inside].tolist())
+            with lock:
+                vals[inside] = [sample[0] for sample in dataset.sample(points)]
+
+    # nodata is compared on the stored values; scale/offset (Int16 re-encoded tiles) come after.
+    invalid = ~np.isfinite(vals)
+    if nodata is not None:
+        invalid |= vals == nodata
+    scale = dataset.scales[0]
+    offset = dataset.offsets[0]
+    if scale != 1.0 or offset != 0.0:
+        vals = vals * scale + offset
+    values: List[Optional[float]] = vals.tolist()
+    for idx in np.flatnonzero(invalid).tolist():
+        values[idx] = None
     return values
 
 
@@ -68,21 +181,41 @@ def elevation_from_lists(lats: List[float], lons: List[float]) -> Dict[str, List
         raise HTTPException(status_code=400, detail="latitude and longitude lengths differ")
 
     elevations: List[Optional[float]] = [None] * len(lats)
-    grouped: Dict[str, List[Tuple[int, float, float]]] = {}
-
-    for idx, (lat, lon) in enumerate(zip(lats, lons)):
-        if not math.isfinite(lat) or not math.isfinite(lon):
-            continue
-        key = tile_key(lat, lon)
-        grouped.setdefault(key, []).append((idx, lon, lat))
 
-    for key, entries in grouped.items():
-        path = tile_path(key)
-        if not os.path.exists(path):
+    lat_arr = np.asarray(lats, dtype=np.float64)
+    lon_arr = np.asarray(lons, dtype=np.float64)
+    # Points outside the lat/lon domain can never match a tile file, so drop them with non-finite input.
+    valid = np.isfinite(lat_arr) & np.isfinite(lon_arr)
+    valid &= (lat_arr >= -90.0) & (lat_arr < 90.0) & (lon_arr >= -180.0) & (lon_arr < 180.0)
+    point_idx = np.flatnonzero(valid)
+    if point_idx.size == 0:
+        return {"elevation": elevations}
+
+    lat_floor = np.floor(lat_arr[point_idx]).astype(np.int64)
+    lon_floor = np.floor(lon_arr[point_idx]).astype(np.int64)
+    tile_ids = (lat_floor + 90) * 360 + (lon_floor + 180)
+    unique_ids, inverse = np.unique(tile_ids, return_inverse=True)
+    # Stable sort groups each tile's points contiguously while preserving request order.
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(inverse, minlength=unique_ids.size))))
+
+    jobs = []
+    for group, tile_id in enumerate(unique_ids.tolist()):
+        path = tile_path(tile_key_from_floor(*tile_id_to_floor(tile_id)))
+        if tile_id not in _datasets and not os.path.exists(path):
             continue
-        coords = [(lon, lat) for _, lon, lat in entries]
-        values = sample_tile(path, coords)
-        for (idx, _, _), value in zip(entries, values):
+        members = point_idx[order[bounds[group] : bounds[group + 1]]]
+        jobs.append((members, tile_id, path, lon_arr[members], lat_arr[members]))
+
+    if len(jobs) > 1 and SAMPLE_WORKERS > 1:
+        # GDAL releases the GIL while reading, so tiles are sampled concurrently;
+        # per-dataset locks keep each reader single-threaded.
+        results = list(_sample_pool.map(lambda job: sample_tile(*job[1:]), jobs))
+    else:
+        results = [sample_tile(*job[1:]) for job in jobs]
+
+    for job, values in zip(jobs, results):
+        for idx, value in zip(job[0].tolist(), values):
             elevations[idx] = value
 
     return {"elevation": elevations}
@@ -5,20 +5,26 @@ Fetch offline data for the ATC stack:
 - OSM PBF (Geofabrik) for local Overpass
 - Copernicus DEM (AWS S3) GeoTIFF tiles for terrain-api
 
-This script uses only the Python standard library.
+This script uses only the Python standard library (`--reencode-int16` additionally
+needs GDAL's `gdal_translate` on PATH).
 """
 
 from __future__ import annotations
 
 import argparse
+import base64
 import concurrent.futures
 import dataclasses
 import hashlib
+import http.client
+import io
 import os
 import random
 import re
 import shutil
+import subprocess
 import sys
+import threading
 import time
 import urllib.error
 import urllib.parse
@@ -35,25 +41,32 @@ GEOFABRIK_URLS: Dict[str, str] = {
 COPERNICUS_BASE_URL = "https://copernicus-dem-30m.s3.amazonaws.com"
 
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, slots=True)
 class TileSpec:
     lat: int
     lon: int
+    # Derived names are formatted once; every tile asks for them several times.
+    _key: str = dataclasses.field(init=False, repr=False, compare=False)
+    _name: str = dataclasses.field(init=False, repr=False, compare=False)
 
-    def key(self) -> str:
+    def __post_init__(self) -> None:
         ns = "N" if self.lat >= 0 else "S"
         ew = "E" if self.lon >= 0 else "W"
-        return f"{ns}{abs(self.lat):02d}_00_{ew}{abs(self.lon):03d}_00"
+        key = f"{ns}{abs(self.lat):02d}_00_{ew}{abs(self.lon):03d}_00"
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_name", f"Copernicus_DSM_COG_10_{key}_DEM")
+
+    def key(self) -> str:
+        return self._key
 
     def name(self) -> str:
-        return f"Copernicus_DSM_COG_10_{self.key()}_DEM"
+        return self._name
 
     def url(self) -> str:
-        name = self.name()
-        return f"{COPERNICUS_BASE_URL}/{name}/{name}.tif"
+        return f"{COPERNICUS_BASE_URL}/{self._name}/{self._name}.tif"
 
     def filename(self) -> str:
-        return f"{self.name()}.tif"
+        return f"{self._name}.tif"
 
 
 def _rng_delay_s(attempt: int, base_s: float = 0.5, max_s: float = 10.0) -> float:
@@ -61,9 +74,164 @@ def _rng_delay_s(attempt: int, base_s: float = 0.5, max_s: float = 10.0) -> floa
     return exp * (0.75 + random.random() * 0.5)
 
 
-def _http_head(url: str, timeout_s: float) -> urllib.response.addinfourl:
-    req = urllib.request.Request(url, method="HEAD")
-    return urllib.request.urlopen(req, timeout=timeout_s)
+MAX_REDIRECTS = 5
+
+# One keep-alive connection per (thread, scheme, host): each worker reuses its TCP+TLS
+# session across tiles instead of handshaking for every request.
+_connections = threading.local()
+
+
+def _proxy_for(scheme: str, netloc: str) -> Optional[urllib.parse.SplitResult]:
+    # Same lookup urlopen's ProxyHandler does: HTTP_PROXY/HTTPS_PROXY, minus NO_PROXY hosts.
+    proxy = urllib.request.getproxies().get(scheme)
+    if not proxy or urllib.request.proxy_bypass(netloc):
+        return None
+    if "://" not in proxy:
+        proxy = f"http://{proxy}"
+    return urllib.parse.urlsplit(proxy)
+
+
+def _proxy_auth_headers(proxy: urllib.parse.SplitResult) -> Dict[str, str]:
+    if not proxy.username:
+        return {}
+    creds = f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+    return {"Proxy-Authorization": "Basic " + base64.b64encode(creds.encode("utf-8")).decode("ascii")}
+
+
+def _connection(
+    scheme: str, netloc: str, timeout_s: float
+) -> Tuple[http.client.HTTPConnection, Optional[Dict[str, str]]]:
+    """Return this thread's connection for (scheme, netloc).
+
+    The second item is None when requests go out in origin form (direct, or https tunnelled
+    through a proxy with CONNECT). Otherwise plain http goes through a forwarding proxy:
+    send the absolute URL and add the returned headers.
+    """
+    pool = getattr(_connections, "pool", None)
+    if pool is None:
+        pool = _connections.pool = {}
+    entry = pool.get((scheme, netloc))
+    if entry is None:
+        proxy = _proxy_for(scheme, netloc)
+        if proxy is None:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            entry = (cls(netloc, timeout=timeout_s), None)
+        elif scheme == "https":
+            conn = http.client.HTTPSConnection(proxy.hostname, proxy.port or 80, timeout=timeout_s)
+            conn.set_tunnel(netloc, headers=_proxy_auth_headers(proxy))
+            entry = (conn, None)
+        else:
+            conn = http.client.HTTPConnection(proxy.hostname, proxy.port or 80, timeout=timeout_s)
+            entry = (conn, _proxy_auth_headers(proxy))
+        pool[(scheme, netloc)] = entry
+    return entry
+
+
+def _drop_connection(scheme: str, netloc: str) -> None:
+    entry = getattr(_connections, "pool", {}).pop((scheme, netloc), None)
+    if entry is not None:
+        entry[0].close()
+
+
+def _http_request(
+    method: str,
+    url: str,
+    timeout_s: float,
+    headers: Optional[Dict[str, str]] = None,
+) -> http.client.HTTPResponse:
+    """Send a request on this thread's pooled connection, following redirects.
+
+    Raises urllib.error.HTTPError for 4xx/5xx like urlopen does. The caller must read
+    (or close) the returned response before the connection can be reused.
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urllib.parse.urlsplit(url)
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        for fresh in (False, True):
+            conn, proxy_headers = _connection(parts.scheme, parts.netloc, timeout_s)
+            req_target, req_headers = target, headers or {}
+            if proxy_headers is not None:
+                req_target = urllib.parse.urlunsplit((parts.scheme, parts.netloc, target, "", ""))
+                req_headers = {**req_headers, **proxy_headers}
+            try:
+                conn.request(method, req_target, headers=req_headers)
+                resp = conn.getresponse()
+                break
+            except (http.client.RemoteDisconnected, ConnectionError, http.client.CannotSendRequest):
+                # The server closed an idle keep-alive connection; retry once on a new one.
+                _drop_connection(parts.scheme, parts.netloc)
+                if fresh:
+                    raise
+            except Exception:
+                _drop_connection(parts.scheme, parts.netloc)
+                raise
+
+        if resp.status in (301, 302, 303, 307, 308) and resp.getheader("Location"):
+            resp.read()
+            url = urllib.parse.urljoin(url, resp.getheader("Location"))
+            continue
+        if resp.status >= 400:
+            body = resp.read()
+            raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(body))
+        return resp
+    raise IOError(f"too many redirects: {url}")
+
+
+def _http_get_bytes(url: str, timeout_s: float, retries: int) -> bytes:
+    for attempt in range(retries + 1):
+        try:
+            resp = _http_request("GET", url, timeout_s=timeout_s)
+            try:
+                return resp.read()
+            finally:
+                resp.close()
+        except urllib.error.HTTPError as e:
+            if attempt >= retries or e.code < 500:
+                raise
+        except Exception:
+            if attempt >= retries:
+                raise
+        time.sleep(_rng_delay_s(attempt))
+    raise AssertionError("unreachable")
+
+
+def _remote_length(resp: http.client.HTTPResponse, start: int) -> Optional[int]:
+    # 206 carries the full size in Content-Range ("bytes 100-199/200"); 200 in Content-Length.
+    if resp.status == 206:
+        total = (resp.getheader("Content-Range") or "").rpartition("/")[2]
+        if total.isdigit():
+            return int(total)
+        start_len = resp.getheader("Content-Length")
+        return start + int(start_len) if start_len and start_len.isdigit() else None
+    cl = resp.getheader("Content-Length")
+    return int(cl) if cl and cl.isdigit() else None
+
+
+DOWNLOAD_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def _copy_response(resp, f, hasher=None, drop_cache: bool = True) -> None:
+    # Reads straight into one reused buffer instead of allocating a bytes object per chunk.
+    buf = bytearray(DOWNLOAD_BLOCK_SIZE)
+    view = memoryview(buf)
+    while True:
+        n = resp.readinto(view)
+        if not n:
+            break
+        f.write(view[:n])
+        if hasher is not None:
+            hasher.update(view[:n])
+    f.flush()
+    if drop_cache and hasattr(os, "posix_fadvise"):
+        # Downloads are written once and read back later (if at all); keep them out of the page cache.
+        # No fsync first: pages still dirty are skipped by the kernel and age out on writeback,
+        # which beats a blocking disk sync per tile.
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
 
 
 def _download_with_resume(
@@ -71,51 +239,70 @@ def _download_with_resume(
     dest: Path,
     timeout_s: float,
     retries: int,
-) -> None:
+    digest: Optional[str] = None,
+    drop_cache: bool = True,
+) -> Optional[str]:
+    """Download url to dest, resuming a leftover .part file.
+
+    With digest (a hashlib name), the file is hashed as it streams in and the hex digest
+    is returned. None means the file was not downloaded in this call (already present),
+    so the caller has to hash it from disk. Pass drop_cache=False when the file is about
+    to be read back, so it stays in the page cache.
+    """
     dest.parent.mkdir(parents=True, exist_ok=True)
     tmp = dest.with_suffix(dest.suffix + ".part")
 
     for attempt in range(retries + 1):
         try:
-            remote_len: Optional[int] = None
-            try:
-                with _http_head(url, timeout_s=timeout_s) as head:
-                    cl = head.headers.get("Content-Length")
-                    if cl and cl.isdigit():
-                        remote_len = int(cl)
-            except Exception:
-                remote_len = None
-
             if dest.exists() and dest.is_file():
+                # Only an already-finished file needs a HEAD to check it against the remote size.
+                remote_len: Optional[int] = None
+                try:
+                    head = _http_request("HEAD", url, timeout_s=timeout_s)
+                    head.read()
+                    remote_len = _remote_length(head, 0)
+                except Exception:
+                    remote_len = None
                 if remote_len is None or dest.stat().st_size == remote_len:
-                    return
+                    return None
 
             start = tmp.stat().st_size if tmp.exists() else 0
-            if remote_len is not None and start >= remote_len and start > 0:
-                tmp.replace(dest)
-                return
-
-            req = urllib.request.Request(url)
-            if start > 0:
-                req.add_header("Range", f"bytes={start}-")
+            headers = {"Range": f"bytes={start}-"} if start > 0 else {}
 
-            with urllib.request.urlopen(req, timeout=timeout_s) as resp:
-                if start > 0 and getattr(resp, "status", None) == 200:
+            resp = _http_request("GET", url, timeout_s=timeout_s, headers=headers)
+            try:
+                if start > 0 and resp.status == 200:
                     start = 0
                     tmp.unlink(missing_ok=True)
+                remote_len = _remote_length(resp, start)
+                hasher = None
+                if digest is not None:
+                    if start > 0:
+                        # Resuming: only the bytes already on disk need a read-back.
+                        with tmp.open("rb") as part:
+                            hasher = _digest_file(part, digest)
+                    else:
+                        hasher = hashlib.new(digest)
                 mode = "ab" if start > 0 else "wb"
                 with tmp.open(mode) as f:
-                    shutil.copyfileobj(resp, f, length=1024 * 1024)
+                    _copy_response(resp, f, hasher, drop_cache)
+            except Exception:
+                # A partially read body leaves the connection unusable.
+                parts = urllib.parse.urlsplit(url)
+                _drop_connection(parts.scheme, parts.netloc)
+                raise
+            finally:
+                resp.close()
 
             if remote_len is not None and tmp.exists() and tmp.stat().st_size != remote_len:
                 raise IOError(f"incomplete download: {tmp.stat().st_size} != {remote_len}")
 
             tmp.replace(dest)
-            return
+            return hasher.hexdigest() if hasher is not None else None
         except urllib.error.HTTPError as e:
             if e.code == 416 and tmp.exists() and tmp.stat().st_size > 0:
                 tmp.replace(dest)
-                return
+                return None
             if attempt >= retries:
                 raise
         except Exception:
@@ -124,12 +311,51 @@ def _download_with_resume(
         time.sleep(_rng_delay_s(attempt))
 
 
+def _digest_file(f, digest: str):
+    if hasattr(hashlib, "file_digest"):  # Python 3.11+: hashes in C with a reused buffer.
+        return hashlib.file_digest(f, digest)
+    h = hashlib.new(digest)
+    for chunk in iter(lambda: f.read(16 * 1024 * 1024), b""):
+        h.update(chunk)
+    return h
+
+
 def _md5sum(path: Path) -> str:
-    h = hashlib.md5()
     with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
+        return _digest_file(f, "md5").hexdigest()
+
+
+INT16_TRANSLATE_ARGS = (
+    "-ot",
+    "Int16",
+    "-co",
+    "COMPRESS=ZSTD",
+    "-co",
+    "PREDICTOR=2",
+    "-co",
+    "TILED=YES",
+    "-co",
+    "BLOCKXSIZE=512",
+    "-co",
+    "BLOCKYSIZE=512",
+)
+
+
+def _reencode_int16(path: Path) -> None:
+    """Rewrite a DEM tile as whole-metre Int16 (half the bytes of Float32) in place."""
+    tmp = path.with_suffix(".int16.tif")
+    try:
+        subprocess.run(
+            ["gdal_translate", "-q", *INT16_TRANSLATE_ARGS, str(path), str(tmp)],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+    except subprocess.CalledProcessError as e:
+        tmp.unlink(missing_ok=True)
+        stderr = (e.stderr or b"").decode("utf-8", errors="replace").strip()
+        raise IOError(f"gdal_translate failed: {stderr or e}") from e
+    tmp.replace(path)
 
 
 def fetch_osm(region: str, out_dir: Path, timeout_s: float, retries: int) -> Path:
@@ -142,10 +368,12 @@ def fetch_osm(region: str, out_dir: Path, timeout_s: float, retries: int) -> Pat
     md5_dest = out_dir / f"{dest.name}.md5"
 
     print(f"[osm] downloading: {url}")
-    _download_with_resume(url, dest=dest, timeout_s=timeout_s, retries=retries)
+    streamed_md5 = _download_with_resume(url, dest=dest, timeout_s=timeout_s, retries=retries, digest="md5")
 
+    # The sidecar is a few dozen bytes: one GET on the connection the PBF just used,
+    # with none of the HEAD/resume bookkeeping.
     try:
-        _download_with_resume(md5_url, dest=md5_dest, timeout_s=timeout_s, retries=retries)
+        md5_dest.write_bytes(_http_get_bytes(md5_url, timeout_s=timeout_s, retries=retries))
     except Exception:
         md5_dest.unlink(missing_ok=True)
 
@@ -155,7 +383,8 @@ def fetch_osm(region: str, out_dir: Path, timeout_s: float, retries: int) -> Pat
         m = re.match(r"^([0-9a-fA-F]{32})\s+\*?(.+)$", md5_text)
         if m:
             expected = m.group(1).lower()
-            actual = _md5sum(dest)
+            # Hashed while downloading; only a file left from an earlier run is re-read.
+            actual = streamed_md5 or _md5sum(dest)
             if actual != expected:
                 raise SystemExit(f"[osm] md5 mismatch for {dest.name}: expected {expected}, got {actual}")
             print(f"[osm] md5 ok: {dest.name}")
@@ -167,14 +396,16 @@ def fetch_osm(region: str, out_dir: Path, timeout_s: float, retries: int) -> Pat
     return dest
 
 
-def _tiles_from_ranges(lat_min: int, lat_max: int, lon_min: int, lon_max: int) -> Iterator[TileSpec]:
+def _tiles_from_ranges(lat_min: int, lat_max: int, lon_min: int, lon_max: int) -> Iterator[Tuple[int, int]]:
+    lons = range(lon_min, lon_max + 1)
     for lat in range(lat_min, lat_max + 1):
-        for lon in range(lon_min, lon_max + 1):
-            yield TileSpec(lat=lat, lon=lon)
+        for lon in lons:
+            yield (lat, lon)
 
 
 def tiles_for_extent(extent: str) -> List[TileSpec]:
-    tiles: Set[TileSpec] = set()
+    # Dedup and sort plain (lat, lon) tuples; TileSpecs are only built for the survivors.
+    tiles: Set[Tuple[int, int]] = set()
 
     # Contiguous US
     if extent in {"conus", "us50", "us"}:
@@ -204,7 +435,7 @@ def tiles_for_extent(extent: str) -> List[TileSpec]:
             f"Unknown extent '{extent}'. Try: conus, alaska, hawaii, pr, us50, us, all"
         )
 
-    return sorted(tiles, key=lambda t: (t.lat, t.lon))
+    return [TileSpec(lat=lat, lon=lon) for lat, lon in sorted(tiles)]
 
 
 def fetch_terrain(
@@ -215,8 +446,11 @@ def fetch_terrain(
     retries: int,
     limit: int,
     fail_on_missing: bool,
+    reencode_int16: bool = False,
 ) -> None:
     out_dir.mkdir(parents=True, exist_ok=True)
+    if reencode_int16 and shutil.which("gdal_translate") is None:
+        raise SystemExit("[terrain] --reencode-int16 requires gdal_translate (GDAL) on PATH")
 
     all_tiles = tiles_for_extent(extent)
     if limit > 0:
@@ -227,7 +461,10 @@ def fetch_terrain(
         if dest.exists() and dest.stat().st_size > 0:
             return (tile, "exists", None)
         try:
-            _download_with_resume(tile.url(), dest=dest, timeout_s=timeout_s, retries=retries)
+            # A tile that is re-encoded next is read straight back by gdal_translate.
+            _download_with_resume(
+                tile.url(), dest=dest, timeout_s=timeout_s, retries=retries, drop_cache=not reencode_int16
+            )
             return (tile, "downloaded", None)
         except urllib.error.HTTPError as e:
             if e.code == 404:
@@ -242,7 +479,20 @@ def fetch_terrain(
     downloaded = 0
     existed = 0
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+    def encode(tile: TileSpec) -> Optional[str]:
+        try:
+            _reencode_int16(out_dir / tile.filename())
+            return None
+        except Exception as e:
+            return f"{e.__class__.__name__}: {e}"
+
+    # gdal_translate is CPU-bound and runs out of process, so re-encodes get their own
+    # pool sized to the CPU count and network workers keep downloading meanwhile.
+    encode_workers = (os.cpu_count() or 1) if reencode_int16 else 1
+    encodes: List[Tuple[TileSpec, "concurrent.futures.Future[Optional[str]]"]] = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=encode_workers) as encoder:
         futures = [executor.submit(task, tile) for tile in all_tiles]
         completed = 0
         for future in concurrent.futures.as_completed(futures):
@@ -250,6 +500,8 @@ def fetch_terrain(
             completed += 1
             if status == "downloaded":
                 downloaded += 1
+                if reencode_int16:
+                    encodes.append((tile, encoder.submit(encode, tile)))
             elif status == "exists":
                 existed += 1
             elif status == "missing":
@@ -259,6 +511,12 @@ def fetch_terrain(
             if completed == 1 or completed % 50 == 0 or completed == len(all_tiles):
                 print(f"[terrain] progress: {completed}/{len(all_tiles)}")
 
+        for tile, encoded in encodes:
+            err = encoded.result()
+            if err:
+                downloaded -= 1
+                failures.append((tile, err))
+
     print(
         f"[terrain] done: downloaded={downloaded}, existed={existed}, missing={len(missing)}, failed={len(failures)}"
     )
@@ -301,6 +559,11 @@ def main(argv: Sequence[str]) -> int:
         action="store_true",
         help="Fail if a Copernicus tile returns 404 (default: skip missing tiles, often ocean-only)",
     )
+    terr_p.add_argument(
+        "--reencode-int16",
+        action="store_true",
+        help="Re-encode newly downloaded tiles as Int16 (whole metres, ZSTD) via gdal_translate",
+    )
 
     all_p = subparsers.add_parser("all", help="Download both OSM and terrain")
     all_p.add_argument("--region", default="us", choices=sorted(GEOFABRIK_URLS.keys()))
@@ -316,6 +579,11 @@ def main(argv: Sequence[str]) -> int:
         action="store_true",
         help="Fail if a Copernicus tile returns 404 (default: skip missing tiles, often ocean-only)",
     )
+    all_p.add_argument(
+        "--reencode-int16",
+        action="store_true",
+        help="Re-encode newly downloaded tiles as Int16 (whole metres, ZSTD) via gdal_translate",
+    )
 
     args = parser.parse_args(list(argv))
     data_root = Path(args.data_root)
@@ -335,6 +603,7 @@ def main(argv: Sequence[str]) -> int:
             retries=args.retries,
             limit=args.limit,
             fail_on_missing=args.fail_on_missing,
+            reencode_int16=args.reencode_int16,
         )
         return 0
     if args.cmd == "all":
@@ -347,6 +616,7 @@ def main(argv: Sequence[str]) -> int:
             retries=args.retries,
             limit=args.limit,
             fail_on_missing=args.fail_on_missing,
+            reencode_int16=args.reencode_int16,
         )
         return 0
 
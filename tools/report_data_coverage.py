@@ -10,13 +10,26 @@ from __future__ import annotations
 
 import argparse
 import os
-import re
 import sys
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 
-TILE_RE = re.compile(r"^Copernicus_DSM_COG_10_([NS])(\d{2})_00_([EW])(\d{3})_00_DEM\.tif$")
+TILE_PREFIX = "Copernicus_DSM_COG_10_"
+TILE_SUFFIX = "_DEM.tif"
+
+
+def _parse_tile_name(name: str) -> Optional[Tuple[int, int]]:
+    # Fixed layout: Copernicus_DSM_COG_10_{N|S}dd_00_{E|W}ddd_00_DEM.tif
+    if len(name) != 44 or name[25:29] != "_00_" or name[33:] != "_00_DEM.tif":
+        return None
+    ns, lat_s, ew, lon_s = name[22], name[23:25], name[29], name[30:33]
+    # isdigit() alone accepts non-ASCII digits such as superscripts, which int() rejects.
+    digits = lat_s + lon_s
+    if ns not in "NS" or ew not in "EW" or not (digits.isascii() and digits.isdigit()):
+        return None
+    lat, lon = int(lat_s), int(lon_s)
+    return (lat if ns == "N" else -lat, lon if ew == "E" else -lon)
 
 
 def _human_gb(bytes_: int) -> str:
@@ -34,8 +47,21 @@ def _list_osm(osm_dir: Path) -> None:
         print(f"  - {p.name} ({_human_gb(p.stat().st_size)})")
 
 
+def _scan_terrain(terrain_dir: Path) -> List[Tuple[str, int]]:
+    # scandir yields names + d_type in batches; no Path objects or per-entry glob matching.
+    try:
+        with os.scandir(terrain_dir) as it:
+            return [
+                (e.name, e.stat().st_size)
+                for e in it
+                if e.name.startswith(TILE_PREFIX) and e.name.endswith(TILE_SUFFIX) and e.is_file()
+            ]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
 def _list_terrain(terrain_dir: Path) -> None:
-    tif_files = sorted(terrain_dir.glob("Copernicus_DSM_COG_10_*_DEM.tif"))
+    tif_files = _scan_terrain(terrain_dir)
     if not tif_files:
         print(f"[terrain] none found in {terrain_dir}")
         return
@@ -45,19 +71,14 @@ def _list_terrain(terrain_dir: Path) -> None:
     total = 0
     missing_pattern = 0
 
-    for p in tif_files:
-        total += p.stat().st_size
-        m = TILE_RE.match(p.name)
-        if not m:
+    for name, size in tif_files:
+        total += size
+        parsed = _parse_tile_name(name)
+        if parsed is None:
             missing_pattern += 1
             continue
-        ns = m.group(1)
-        lat = int(m.group(2))
-        ew = m.group(3)
-        lon = int(m.group(4))
-
-        lats.append(lat if ns == "N" else -lat)
-        lons.append(lon if ew == "E" else -lon)
+        lats.append(parsed[0])
+        lons.append(parsed[1])
 
     print(f"[terrain] {len(tif_files)} tile(s), total {_human_gb(total)} in {terrain_dir}")
     if lats and lons:
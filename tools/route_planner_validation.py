@@ -7,12 +7,21 @@ Targets:
 
 This script intentionally uses only the Python standard library so it can run
 anywhere the stack runs.
+
+Cases run on a thread pool of --concurrency workers, so that flag is exactly the
+number of requests in flight. Each worker spends nearly all of its time blocked on
+the socket with the GIL released; the planner, not the client, is the bottleneck,
+so an event loop (which the stdlib offers no HTTP client for) would not change
+throughput at the concurrency levels this harness is meant to drive.
 """
 
 from __future__ import annotations
 
 import argparse
+import base64
 import dataclasses
+import hashlib
+import http.client
 import http.cookiejar
 import json
 import math
@@ -22,32 +31,36 @@ import statistics
 import sys
 import threading
 import time
-import urllib.error
+import urllib.parse
 import urllib.request
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 
+EARTH_RADIUS_M = 6371000.0
+
+
 def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    r = 6371000.0
     phi1 = math.radians(lat1)
     phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dl = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dl / 2) ** 2
+    s_dphi = math.sin(math.radians(lat2 - lat1) * 0.5)
+    s_dl = math.sin(math.radians(lon2 - lon1) * 0.5)
+    a = s_dphi * s_dphi + math.cos(phi1) * math.cos(phi2) * s_dl * s_dl
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return r * c
+    return EARTH_RADIUS_M * c
 
 
 def offset_by_bearing(lat: float, lon: float, distance_m: float, bearing_deg: float) -> Tuple[float, float]:
-    r = 6371000.0
-    brng = math.radians(bearing_deg)
     phi1 = math.radians(lat)
-    lam1 = math.radians(lon)
-    d = distance_m / r
+    sin_phi1 = math.sin(phi1)
+    cos_phi1 = math.cos(phi1)
+    brng = math.radians(bearing_deg)
+    d = distance_m / EARTH_RADIUS_M
+    sin_d = math.sin(d)
+    cos_d = math.cos(d)
 
-    phi2 = math.asin(math.sin(phi1) * math.cos(d) + math.cos(phi1) * math.sin(d) * math.cos(brng))
-    lam2 = lam1 + math.atan2(math.sin(brng) * math.sin(d) * math.cos(phi1), math.cos(d) - math.sin(phi1) * math.sin(phi2))
+    phi2 = math.asin(sin_phi1 * cos_d + cos_phi1 * sin_d * math.cos(brng))
+    lam2 = math.radians(lon) + math.atan2(math.sin(brng) * sin_d * cos_phi1, cos_d - sin_phi1 * math.sin(phi2))
     return (math.degrees(phi2), math.degrees(lam2))
 
 
@@ -83,28 +96,148 @@ class TestCase:
         return payload
 
 
+# One keep-alive connection per (worker thread, scheme, host), so consecutive cases on a
+# worker reuse the same socket instead of reconnecting for every request.
+_connections = threading.local()
+
+
+def _proxy_for(scheme: str, netloc: str) -> Optional[urllib.parse.SplitResult]:
+    # Same lookup urlopen's ProxyHandler does: HTTP_PROXY/HTTPS_PROXY, minus NO_PROXY hosts.
+    proxy = urllib.request.getproxies().get(scheme)
+    if not proxy or urllib.request.proxy_bypass(netloc):
+        return None
+    if "://" not in proxy:
+        proxy = f"http://{proxy}"
+    return urllib.parse.urlsplit(proxy)
+
+
+def _proxy_auth_headers(proxy: urllib.parse.SplitResult) -> Dict[str, str]:
+    if not proxy.username:
+        return {}
+    creds = f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+    return {"Proxy-Authorization": "Basic " + base64.b64encode(creds.encode("utf-8")).decode("ascii")}
+
+
+def _connection(
+    scheme: str, netloc: str, timeout_s: float
+) -> Tuple[http.client.HTTPConnection, Optional[Dict[str, str]]]:
+    # The second item is None for origin-form requests (direct, or https tunnelled with
+    # CONNECT); otherwise plain http is forwarded by a proxy, so the caller sends the
+    # absolute URL plus these headers.
+    pool = getattr(_connections, "pool", None)
+    if pool is None:
+        pool = _connections.pool = {}
+    entry = pool.get((scheme, netloc))
+    if entry is None:
+        proxy = _proxy_for(scheme, netloc)
+        if proxy is None:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            entry = (cls(netloc, timeout=timeout_s), None)
+        elif scheme == "https":
+            conn = http.client.HTTPSConnection(proxy.hostname, proxy.port or 80, timeout=timeout_s)
+            conn.set_tunnel(netloc, headers=_proxy_auth_headers(proxy))
+            entry = (conn, None)
+        else:
+            conn = http.client.HTTPConnection(proxy.hostname, proxy.port or 80, timeout=timeout_s)
+            entry = (conn, _proxy_auth_headers(proxy))
+        pool[(scheme, netloc)] = entry
+    return entry
+
+
+def _drop_connection(scheme: str, netloc: str) -> None:
+    entry = getattr(_connections, "pool", {}).pop((scheme, netloc), None)
+    if entry is not None:
+        entry[0].close()
+
+
+def encode_payload(payload: Dict[str, Any]) -> bytes:
+    # Compact separators: the planner doesn't care about whitespace, and bodies shrink ~10%.
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
 def post_json(
     url: str,
-    payload: Dict[str, Any],
+    body: bytes,
     timeout_s: float,
-    opener: Optional[urllib.request.OpenerDirector] = None,
+    cookiejar: Optional[http.cookiejar.CookieJar] = None,
 ) -> Tuple[int, str]:
-    body = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
+    headers = {"Content-Type": "application/json"}
+    req: Optional[urllib.request.Request] = None
+    if cookiejar is not None:
+        # The jar only needs a Request to pick matching cookies; the send goes over http.client.
+        req = urllib.request.Request(url, method="POST")
+        cookiejar.add_cookie_header(req)
+        headers.update(req.header_items())
+
+    parts = urllib.parse.urlsplit(url)
+    target = parts.path or "/"
+    if parts.query:
+        target = f"{target}?{parts.query}"
+    while True:
+        conn, proxy_headers = _connection(parts.scheme, parts.netloc, timeout_s)
+        req_target, req_headers = target, headers
+        if proxy_headers is not None:
+            req_target = urllib.parse.urlunsplit((parts.scheme, parts.netloc, target, "", ""))
+            req_headers = {**headers, **proxy_headers}
+        # http.client connects lazily, so an open socket here means a pooled connection.
+        reused = conn.sock is not None
+        try:
+            conn.request("POST", req_target, body=body, headers=req_headers)
+            resp = conn.getresponse()
+            break
+        except (http.client.RemoteDisconnected, ConnectionError, http.client.CannotSendRequest):
+            # The server may have closed an idle keep-alive connection before reading the
+            # request; retry once on a new one. A fresh connection failing is a real error.
+            _drop_connection(parts.scheme, parts.netloc)
+            if not reused:
+                raise
+        except Exception:
+            _drop_connection(parts.scheme, parts.netloc)
+            raise
+    try:
+        # Past the status line the planner has handled the request, so a failure reading
+        # the body is reported rather than re-POSTed.
+        text = resp.read().decode("utf-8", errors="replace")
+    except Exception:
+        _drop_connection(parts.scheme, parts.netloc)
+        raise
+
+    if cookiejar is not None and req is not None:
+        cookiejar.extract_cookies(resp, req)
+    if resp.will_close:
+        _drop_connection(parts.scheme, parts.netloc)
+    return int(resp.status), text
+
+
+def response_cache_path(cache_dir: str, url: str, payload: Dict[str, Any]) -> str:
+    # Content-addressed on the target and the canonical request, so key order never matters.
+    canonical = json.dumps({"url": url, "payload": payload}, sort_keys=True, separators=(",", ":"))
+    return os.path.join(cache_dir, hashlib.sha256(canonical.encode("utf-8")).hexdigest() + ".json")
+
+
+def load_cached_response(path: str) -> Optional[Tuple[int, str, float]]:
     try:
-        open_fn = opener.open if opener is not None else urllib.request.urlopen
-        with open_fn(req, timeout=timeout_s) as resp:
-            status = int(getattr(resp, "status", 200))
-            return status, resp.read().decode("utf-8", errors="replace")
-    except urllib.error.HTTPError as e:
-        raw = e.read()
-        text = raw.decode("utf-8", errors="replace") if isinstance(raw, (bytes, bytearray)) else str(raw)
-        return int(e.code), text
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+        return int(entry["http_status"]), str(entry["body"]), float(entry["elapsed_ms"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def cacheable_status(case: TestCase, status: int) -> bool:
+    # Only deterministic answers are replayed: successes, and the client errors a negative
+    # case asks for. Rate limits and server errors are transient and must be refetched.
+    if 200 <= status < 300:
+        return True
+    return case.expect_ok is False and 400 <= status < 500 and status != 429
+
+
+def store_cached_response(path: str, status: int, text: str, elapsed_ms: float) -> None:
+    # Write-then-rename so a concurrent reader never sees a partial entry.
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"http_status": status, "body": text, "elapsed_ms": elapsed_ms}, f)
+    os.replace(tmp, path)
 
 
 def parse_json_maybe(text: str) -> Tuple[Optional[Any], Optional[str]]:
@@ -168,7 +301,7 @@ def validate_response(case: TestCase, status: int, data: Any) -> List[str]:
             except Exception:  # noqa: BLE001
                 issues.append("failed to validate endpoint proximity")
 
-            for idx, wp in enumerate(waypoints[: min(len(waypoints), 300)]):
+            for idx, wp in enumerate(waypoints[:300]):
                 if not isinstance(wp, dict):
                     issues.append(f"waypoints[{idx}] not an object")
                     break
@@ -179,6 +312,10 @@ def validate_response(case: TestCase, status: int, data: Any) -> List[str]:
                 except Exception:  # noqa: BLE001
                     issues.append(f"waypoints[{idx}] missing/invalid lat/lon/altitude_m")
                     break
+                # Fast path: NaN/inf fail these comparisons too, so a passing point needs no
+                # separate isfinite check; only a failing one falls through to find out why.
+                if -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0 and -2000 <= alt <= 30000:
+                    continue
                 if not (-90.0 <= lat <= 90.0) or not (-180.0 <= lon <= 180.0):
                     issues.append(f"waypoints[{idx}] out-of-range lat/lon")
                     break
@@ -342,9 +479,18 @@ def build_cases(seed: int, random_cases: int, long_cases: int) -> List[TestCase]
         {"lane_radius_m": 150.0, "max_lane_radius_m": 1500.0, "sample_spacing_m": 7.5},
     ]
 
+    # Choice lists are built once rather than per iteration; the draw sequence (and so the
+    # cases generated for a given seed) is unchanged.
+    regions = [("la", LA), ("sf", SF), ("sd", SD)]
+    safety_buffers = [20.0, 60.0, 120.0]
+    metro_pairs = [
+        (LA, SF, "la-sf"),
+        (SD, LA, "sd-la"),
+        (SF, SD, "sf-sd"),
+    ]
+
     for idx in range(random_cases):
-        region = rng.choice([("la", LA), ("sf", SF), ("sd", SD)])
-        tag, center = region
+        tag, center = rng.choice(regions)
         if rng.random() < 0.75:
             start, end = make_short_route(rng, center, 600.0, 2800.0, alt_m=rng.uniform(40.0, 120.0))
             route_kind = "short"
@@ -353,7 +499,7 @@ def build_cases(seed: int, random_cases: int, long_cases: int) -> List[TestCase]
             route_kind = "medium"
         params = dict(rng.choice(param_grid))
         if rng.random() < 0.25:
-            params["safety_buffer_m"] = rng.choice([20.0, 60.0, 120.0])
+            params["safety_buffer_m"] = rng.choice(safety_buffers)
         cases.append(
             TestCase(
                 name=f"random/{tag}/{route_kind}/{idx:03d}",
@@ -365,13 +511,7 @@ def build_cases(seed: int, random_cases: int, long_cases: int) -> List[TestCase]
 
     # --- Long routes between metros (segmented) ---
     for idx in range(long_cases):
-        start_center, end_center, tag = rng.choice(
-            [
-                (LA, SF, "la-sf"),
-                (SD, LA, "sd-la"),
-                (SF, SD, "sf-sd"),
-            ]
-        )
+        start_center, end_center, tag = rng.choice(metro_pairs)
         start, end = make_long_route(rng, start_center, end_center, alt_m=rng.uniform(60.0, 150.0))
         cases.append(
             TestCase(
@@ -389,13 +529,22 @@ def run_case(
     url: str,
     timeout_s: float,
     case: TestCase,
-    opener: Optional[urllib.request.OpenerDirector] = None,
+    cookiejar: Optional[http.cookiejar.CookieJar] = None,
+    cache_dir: Optional[str] = None,
 ) -> Dict[str, Any]:
     payload = case.request_payload()
     start = time.perf_counter()
     try:
-        status, text = post_json(url, payload, timeout_s, opener=opener)
-        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        cache_path = response_cache_path(cache_dir, url, payload) if cache_dir else None
+        cached = load_cached_response(cache_path) if cache_path else None
+        if cached is not None:
+            # Replayed responses keep the latency measured when they were first fetched.
+            status, text, elapsed_ms = cached
+        else:
+            status, text = post_json(url, encode_payload(payload), timeout_s, cookiejar=cookiejar)
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            if cache_path and cacheable_status(case, status):
+                store_cached_response(cache_path, status, text, elapsed_ms)
         data, parse_err = parse_json_maybe(text)
         issues: List[str] = []
         if parse_err:
@@ -403,8 +552,17 @@ def run_case(
         else:
             issues.extend(validate_response(case, status, data))
 
-        ok_val = data.get("ok") if isinstance(data, dict) else None
-        errors = summarize_errors(data) if isinstance(data, dict) else []
+        # One type check for all the response-derived fields below.
+        if isinstance(data, dict):
+            ok_val = data.get("ok")
+            errors = summarize_errors(data)
+            nodes_visited = data.get("nodes_visited")
+            optimized_points = data.get("optimized_points")
+            sample_points = data.get("sample_points")
+            hazards_count: Optional[int] = len(data.get("hazards") or [])
+        else:
+            ok_val = nodes_visited = optimized_points = sample_points = hazards_count = None
+            errors = []
         return {
             "name": case.name,
             "notes": case.notes,
@@ -419,10 +577,10 @@ def run_case(
             "elapsed_ms": elapsed_ms,
             "ok": ok_val,
             "errors": errors,
-            "nodes_visited": data.get("nodes_visited") if isinstance(data, dict) else None,
-            "optimized_points": data.get("optimized_points") if isinstance(data, dict) else None,
-            "sample_points": data.get("sample_points") if isinstance(data, dict) else None,
-            "hazards_count": (len(data.get("hazards") or []) if isinstance(data, dict) else None),
+            "nodes_visited": nodes_visited,
+            "optimized_points": optimized_points,
+            "sample_points": sample_points,
+            "hazards_count": hazards_count,
             "issues": issues,
             "raw_body_prefix": text[:3000],
         }
@@ -447,13 +605,14 @@ def run_case(
         }
 
 
-def percentile(values: List[float], pct: float) -> Optional[float]:
+def percentiles(values: List[float], pcts: Iterable[float]) -> List[Optional[float]]:
+    # Nearest-rank percentiles, all read off a single sort.
+    pcts = list(pcts)
     if not values:
-        return None
+        return [None] * len(pcts)
     values_sorted = sorted(values)
-    k = int(math.ceil((pct / 100.0) * len(values_sorted))) - 1
-    k = clamp(k, 0, len(values_sorted) - 1)
-    return values_sorted[int(k)]
+    last = len(values_sorted) - 1
+    return [values_sorted[int(clamp(math.ceil((pct / 100.0) * len(values_sorted)) - 1, 0, last))] for pct in pcts]
 
 
 def print_summary(results: List[Dict[str, Any]]) -> None:
@@ -476,11 +635,12 @@ def print_summary(results: List[Dict[str, Any]]) -> None:
     def latency_block(title: str, values: List[float]) -> str:
         if not values:
             return f"{title}: n/a"
+        p50, p90, p99 = percentiles(values, (50, 90, 99))
         return (
             f"{title}: avg={statistics.mean(values):.0f}ms "
-            f"p50={fmt_ms(percentile(values, 50))} "
-            f"p90={fmt_ms(percentile(values, 90))} "
-            f"p99={fmt_ms(percentile(values, 99))} "
+            f"p50={fmt_ms(p50)} "
+            f"p90={fmt_ms(p90)} "
+            f"p99={fmt_ms(p99)} "
             f"max={max(values):.0f}ms"
         )
 
@@ -523,9 +683,17 @@ def main(argv: List[str]) -> int:
     parser.add_argument("--long-cases", type=int, default=10)
     parser.add_argument("--concurrency", type=int, default=4)
     parser.add_argument("--output", default="route_planner_validation_results.json")
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Replay responses for requests already sent to this target (and store new ones) "
+        "from this directory instead of re-sending them",
+    )
     args = parser.parse_args(argv)
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
 
-    opener: Optional[urllib.request.OpenerDirector] = None
+    cookiejar: Optional[http.cookiejar.CookieJar] = None
     base_url = args.base_url.rstrip("/")
     if args.use_frontend_proxy:
         cookiejar = http.cookiejar.CookieJar()
@@ -550,6 +718,8 @@ def main(argv: List[str]) -> int:
     print(f"Cases: {len(cases)} (random={args.random_cases}, long={args.long_cases})")
     print(f"Concurrency: {args.concurrency}")
     print(f"Timeout: {args.timeout_s}s")
+    if args.cache_dir:
+        print(f"Response cache: {args.cache_dir}")
     print("")
 
     lock = threading.Lock()
@@ -566,12 +736,23 @@ def main(argv: List[str]) -> int:
                 rate = completed / elapsed if elapsed > 0 else 0
                 print(f"[progress] {completed}/{len(cases)} ({rate:.2f} req/s)")
 
-    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
-        futs = [pool.submit(run_case, url, args.timeout_s, case, opener) for case in cases]
-        for fut in as_completed(futs):
-            res = fut.result()
-            results.append(res)
-            on_done()
+    workers = max(1, args.concurrency)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Keep exactly `workers` cases in flight; the next one is submitted as each finishes.
+        pending_cases = iter(cases)
+        pending: set[Future[Dict[str, Any]]] = set()
+        for case in pending_cases:
+            pending.add(pool.submit(run_case, url, args.timeout_s, case, cookiejar, args.cache_dir))
+            if len(pending) >= workers:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                results.append(fut.result())
+                on_done()
+                case = next(pending_cases, None)
+                if case is not None:
+                    pending.add(pool.submit(run_case, url, args.timeout_s, case, cookiejar, args.cache_dir))
 
     results.sort(key=lambda r: r.get("name", ""))
 
@@ -2,6 +2,9 @@
 from __future__ import annotations
 
 import argparse
+import bisect
+import concurrent.futures
+import functools
 import hashlib
 import json
 import os
@@ -10,7 +13,12 @@ import sys
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator, TextIO
+
+try:
+    import blake3  # optional; SIMD tree hash, only used with --hash-alg blake3
+except ImportError:
+    blake3 = None
 
 
 EXCLUDED_DIR_NAMES = {
@@ -31,6 +39,17 @@ FINDING_PATTERNS: list[tuple[str, re.Pattern[str]]] = [
     ("todo", re.compile(r"\b(?:TODO|FIXME)\b")),
 ]
 
+# A literal every match of the pattern has to contain. The whole-file pass looks only for
+# these: a plain literal alternation runs far faster in re than the patterns themselves,
+# which mostly open with \b and so get no prefix scan. Hit lines still get the real regex.
+FINDING_LITERALS: dict[str, tuple[str, ...]] = {
+    "private_key": ("-----BEGIN ",),
+    "insecure_tls": ("verify",),
+    "rust_unwrap": (".unwrap(", ".expect("),
+    "eval_exec": ("eval", "exec"),
+    "todo": ("TODO", "FIXME"),
+}
+
 ALLOWLIST_PRIVATE_KEY_PATH_PATTERNS: list[re.Pattern[str]] = [
     # Vendored crate examples with intentionally-in-repo self-signed keys.
     re.compile(r"(?:^|/)vendor/axum-server-[^/]+/examples/self-signed-certs/"),
@@ -57,6 +76,19 @@ EVAL_EXEC_EXTS = {".cjs", ".js", ".mjs", ".py", ".ts", ".tsx"}
 INSECURE_TLS_EXTS = {".py"}
 RUST_UNWRAP_EXTS = {".rs"}
 
+READ_CHUNK_BYTES = 256 * 1024
+
+# sha256 stays the default and keeps the record's "sha256" field; OpenSSL already uses the
+# SHA extensions (SHA-NI / ARMv8 SHA2) where the CPU has them.
+HASH_ALGS = ("sha256", "blake2b", "blake3", "none")
+
+# Everything str.splitlines() treats as a line boundary; ODD_BREAK_RE is all of it but "\n".
+LINE_BREAK_RE = re.compile(r"\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+ODD_BREAK_RE = re.compile(r"[\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+# The same boundaries as they can appear in pure-ASCII bytes.
+LINE_BREAK_BYTES_RE = re.compile(rb"\r\n|[\n\r\v\f\x1c\x1d\x1e]")
+ODD_BREAK_BYTES_RE = re.compile(rb"[\r\v\f\x1c\x1d\x1e]")
+
 
 @dataclass(frozen=True)
 class Finding:
@@ -67,67 +99,193 @@ class Finding:
     snippet: str
 
 
-def sha256_hex(data: bytes) -> str:
-    h = hashlib.sha256()
-    h.update(data)
-    return h.hexdigest()
-
-
 def looks_binary(data: bytes) -> bool:
     return b"\0" in data
 
 
-def iter_files(root: Path) -> Iterable[Path]:
-    for dirpath, dirnames, filenames in os.walk(root):
-        dirnames[:] = [d for d in dirnames if d not in EXCLUDED_DIR_NAMES]
-        for filename in filenames:
-            yield Path(dirpath) / filename
+def iter_files(root: Path) -> Iterator[os.DirEntry[str]]:
+    """Yield an entry for every regular file (or symlink to one) under root.
+
+    scandir hands back d_type with each name, so directories are pruned and files picked
+    without a stat per entry or a Path object per file. Symlinked directories are not
+    followed, matching os.walk.
+    """
+    stack = [str(root)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in EXCLUDED_DIR_NAMES:
+                            stack.append(entry.path)
+                    elif entry.is_file():
+                        yield entry
+                except OSError:
+                    continue
+
+
+def path_sort_key(path: str) -> list[str]:
+    # Same order sorted() gave the old Path objects: component-wise, not raw string order.
+    return path.split(os.sep)
+
 
+def name_suffix(name: str) -> str:
+    # pathlib's PurePath.suffix rule, without building a Path.
+    i = name.rfind(".")
+    return name[i:] if 0 < i < len(name) - 1 else ""
 
-def file_ext_key(path: Path) -> str:
-    if path.name == "Dockerfile":
+
+def file_ext_key(name: str) -> str:
+    if name == "Dockerfile":
         return "Dockerfile"
-    return path.suffix
+    return name_suffix(name)
 
 
-def is_allowlisted_private_key(path: Path) -> bool:
-    posix = path.as_posix()
+def is_allowlisted_private_key(path: str) -> bool:
+    posix = path.replace(os.sep, "/")
     return any(pattern.search(posix) for pattern in ALLOWLIST_PRIVATE_KEY_PATH_PATTERNS)
 
 
-def scan_file(path: Path) -> tuple[dict, list[Finding]]:
-    data = path.read_bytes()
-    is_binary = looks_binary(data)
-    file_record = {
-        "path": str(path),
-        "size": len(data),
-        "sha256": sha256_hex(data),
-        "binary": is_binary,
-    }
+# Patterns that can fire for a file, by the conditions that gate them.
+_COMBINED_CACHE: dict[
+    tuple[str, ...], tuple[re.Pattern[str], re.Pattern[bytes], list[tuple[str, re.Pattern[str]]]]
+] = {}
+
+
+def allowed_patterns(
+    ext: str, allow_private_key: bool
+) -> tuple[re.Pattern[str], re.Pattern[bytes], list[tuple[str, re.Pattern[str]]]]:
+    """Return one literal prefilter for the patterns enabled for this file (as str and as bytes),
+    plus the patterns themselves."""
+    names = tuple(
+        name
+        for name, _ in FINDING_PATTERNS
+        if not (
+            (name == "private_key" and not allow_private_key)
+            or (name == "rust_unwrap" and ext not in RUST_UNWRAP_EXTS)
+            or (name == "eval_exec" and ext not in EVAL_EXEC_EXTS)
+            or (name == "insecure_tls" and ext not in INSECURE_TLS_EXTS)
+            or (name == "todo" and ext not in TODO_EXTS)
+        )
+    )
+    cached = _COMBINED_CACHE.get(names)
+    if cached is None:
+        enabled = [(name, pattern) for name, pattern in FINDING_PATTERNS if name in names]
+        literals = "|".join(re.escape(lit) for name, _ in enabled for lit in FINDING_LITERALS[name])
+        combined = re.compile(literals)
+        combined_bytes = re.compile(literals.encode("ascii"))
+        cached = _COMBINED_CACHE[names] = (combined, combined_bytes, enabled)
+    return cached
+
+
+def hit_lines(text: str | bytes, positions: Iterable[int]) -> Iterator[tuple[int, str | bytes]]:
+    """Yield (line number, line text) once per line containing any of the sorted offsets.
+
+    Line numbering follows str.splitlines(), but only the lines that are asked for are
+    ever sliced out of the text. Bytes input must be pure ASCII.
+    """
+    if isinstance(text, str):
+        newline, odd_break_re, line_break_re = "\n", ODD_BREAK_RE, LINE_BREAK_RE
+    else:
+        newline, odd_break_re, line_break_re = b"\n", ODD_BREAK_BYTES_RE, LINE_BREAK_BYTES_RE
+    if odd_break_re.search(text) is None:
+        # Plain "\n" text (the common case): walk forward with C-level find/count.
+        line_no, line_start, line_end = 1, 0, -1
+        for pos in positions:
+            if pos < line_end:
+                continue
+            line_no += text.count(newline, line_start, pos)
+            line_start = text.rfind(newline, 0, pos) + 1
+            line_end = text.find(newline, pos)
+            if line_end == -1:
+                line_end = len(text)
+            yield line_no, text[line_start:line_end]
+        return
+
+    breaks = list(line_break_re.finditer(text))
+    starts = [m.start() for m in breaks]
+    last = -1
+    for pos in positions:
+        idx = bisect.bisect_right(starts, pos)
+        if idx == last:
+            continue
+        last = idx
+        line_start = breaks[idx - 1].end() if idx else 0
+        line_end = starts[idx] if idx < len(starts) else len(text)
+        yield idx + 1, text[line_start:line_end]
+
+
+def new_hasher(hash_alg: str):
+    if hash_alg == "none":
+        return None
+    if hash_alg == "blake3":
+        return blake3.blake3()
+    return hashlib.new(hash_alg)
+
+
+def read_hashed(path: str, hash_alg: str = "sha256") -> tuple[int, str | None, bool, bytearray | None]:
+    """Hash and NUL-check a file in one streaming pass.
+
+    Returns (size, hex digest, binary, data); the digest is None for hash_alg "none", and
+    data is only kept for text files, so a binary never sits in memory beyond one chunk.
+    Without a hash, reading stops at the first chunk that shows the file is binary.
+    """
+    h = new_hasher(hash_alg)
+    size = 0
+    buf: bytearray | None = bytearray()
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK_BYTES):
+            if h is not None:
+                h.update(chunk)
+            size += len(chunk)
+            if buf is not None:
+                if looks_binary(chunk):
+                    buf = None
+                    if h is None:
+                        # Nothing left to learn from the rest of the file but its length.
+                        size = max(size, os.fstat(f.fileno()).st_size)
+                        break
+                else:
+                    buf += chunk
+    return size, h.hexdigest() if h is not None else None, buf is None, buf
+
+
+def scan_file(path: str, hash_alg: str = "sha256") -> tuple[dict, list[Finding]]:
+    size, digest, is_binary, data = read_hashed(path, hash_alg)
+    if hash_alg == "sha256":
+        file_record = {"path": path, "size": size, "sha256": digest, "binary": is_binary}
+    else:
+        file_record = {"path": path, "size": size, "hash": digest, "hash_alg": hash_alg, "binary": is_binary}
 
     findings: list[Finding] = []
     if is_binary:
         return file_record, findings
 
-    try:
-        text = data.decode("utf-8")
-    except UnicodeDecodeError:
+    ext = name_suffix(os.path.basename(path)).lower()
+    combined, combined_bytes, enabled = allowed_patterns(ext, not is_allowlisted_private_key(path))
+    if not enabled:
         return file_record, findings
 
-    ext = path.suffix.lower()
-
-    for line_idx, line in enumerate(text.splitlines(), start=1):
-        for pattern_name, pattern in FINDING_PATTERNS:
-            if pattern_name == "private_key" and is_allowlisted_private_key(path):
-                continue
-            if pattern_name == "rust_unwrap" and ext not in RUST_UNWRAP_EXTS:
-                continue
-            if pattern_name == "eval_exec" and ext not in EVAL_EXEC_EXTS:
-                continue
-            if pattern_name == "insecure_tls" and ext not in INSECURE_TLS_EXTS:
-                continue
-            if pattern_name == "todo" and ext not in TODO_EXTS:
-                continue
+    text: str | bytearray
+    if data.isascii():
+        # ASCII is valid UTF-8 as-is: search the raw bytes and decode only the hit lines.
+        text, combined = data, combined_bytes
+    else:
+        # Anything else still gets the full decode, so invalid UTF-8 keeps yielding no findings.
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            return file_record, findings
+
+    # One C-level pass over the whole file finds the lines that could hit; only those lines
+    # get the per-pattern checks (still per line, matching the old line-by-line semantics).
+    for line_idx, raw_line in hit_lines(text, (m.start() for m in combined.finditer(text))):
+        line = raw_line if isinstance(raw_line, str) else raw_line.decode("ascii")
+        for pattern_name, pattern in enabled:
             if not pattern.search(line):
                 continue
             kind = "secret" if pattern_name == "private_key" else "risk"
@@ -135,7 +293,7 @@ def scan_file(path: Path) -> tuple[dict, list[Finding]]:
                 Finding(
                     kind=kind,
                     pattern=pattern_name,
-                    file=str(path),
+                    file=path,
                     line=line_idx,
                     snippet=line.strip()[:500],
                 )
@@ -144,6 +302,27 @@ def scan_file(path: Path) -> tuple[dict, list[Finding]]:
     return file_record, findings
 
 
+def nested_json(value: object, depth: int) -> str:
+    # json.dumps(value, indent=2) as it would appear `depth` levels inside a larger document.
+    return json.dumps(value, indent=2).replace("\n", "\n" + "  " * depth)
+
+
+def json_item(value: object) -> str:
+    return "    " + nested_json(value, 2)
+
+
+def write_json_list(f: TextIO, key: str, items: list[str]) -> None:
+    if not items:
+        f.write(f"  {json.dumps(key)}: []")
+        return
+    f.write(f"  {json.dumps(key)}: [\n")
+    for i, item in enumerate(items):
+        if i:
+            f.write(",\n")
+        f.write(item)
+    f.write("\n  ]")
+
+
 def main(argv: list[str]) -> int:
     parser = argparse.ArgumentParser(description="Full-file ship-readiness scan (reads every file).")
     parser.add_argument(
@@ -157,40 +336,84 @@ def main(argv: list[str]) -> int:
         default="ship_audit_scan.json",
         help="Output JSON path (default: ship_audit_scan.json in CWD)",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for hashing/regex scanning (default: CPU count)",
+    )
+    parser.add_argument(
+        "--hash-alg",
+        choices=HASH_ALGS,
+        default="sha256",
+        help="Content hash per file (default: sha256). Others record 'hash' + 'hash_alg' "
+        "instead of 'sha256'; 'none' skips hashing when only findings are needed.",
+    )
     args = parser.parse_args(argv)
+    if args.hash_alg == "blake3" and blake3 is None:
+        parser.error("--hash-alg blake3 requires the 'blake3' package")
 
     root = Path(args.root).resolve()
     out_path = Path(args.out).resolve()
 
-    files: list[dict] = []
-    findings: list[Finding] = []
+    file_items: list[tuple[list[str], str]] = []
+    finding_items: list[tuple[list[str], str]] = []
     ext_counts: dict[str, int] = {}
     total_bytes = 0
 
-    for path in sorted(iter_files(root)):
-        if not path.is_file():
-            continue
-        if path.resolve() == out_path:
-            continue
-        record, file_findings = scan_file(path)
-        files.append(record)
-        total_bytes += record["size"]
-        key = file_ext_key(path)
-        ext_counts[key] = ext_counts.get(key, 0) + 1
-        findings.extend(file_findings)
-
-    payload = {
+    # Only a file named like the output, or a symlink, can resolve to the output path.
+    paths = (
+        entry.path
+        for entry in iter_files(root)
+        if not (
+            (entry.name == out_path.name or entry.is_symlink())
+            and Path(entry.path).resolve() == out_path
+        )
+    )
+
+    def consume(results: Iterable[tuple[dict, list[Finding]]]) -> None:
+        # Records are serialized as they arrive, so only their JSON text is kept around.
+        nonlocal total_bytes
+        for record, file_findings in results:
+            path = record["path"]
+            sort_key = path_sort_key(path)
+            file_items.append((sort_key, json_item(record)))
+            total_bytes += record["size"]
+            key = file_ext_key(os.path.basename(path))
+            ext_counts[key] = ext_counts.get(key, 0) + 1
+            finding_items.extend((sort_key, json_item(f.__dict__)) for f in file_findings)
+
+    scan = functools.partial(scan_file, hash_alg=args.hash_alg)
+    # Hashing and regex scanning are CPU-bound, so fan out to processes. Paths are fed to the
+    # pool while the walk is still running; the output is put in path order afterwards.
+    if args.jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            consume(pool.map(scan, paths, chunksize=32))
+    else:
+        consume(scan(p) for p in paths)
+
+    # Stable sorts: a file's findings stay in line order behind their shared key.
+    file_items.sort(key=lambda item: item[0])
+    finding_items.sort(key=lambda item: item[0])
+
+    header = {
         "generated_at": datetime.now(timezone.utc).isoformat(),
         "roots": [str(root)],
-        "total_files": len(files),
+        "total_files": len(file_items),
         "total_bytes": total_bytes,
         "ext_counts": dict(sorted(ext_counts.items(), key=lambda kv: (kv[0] == "", kv[0]))),
-        "files": files,
-        "findings": [f.__dict__ for f in findings],
     }
 
-    out_path.write_text(json.dumps(payload, indent=2, sort_keys=False) + "\n", encoding="utf-8")
-    print(f"ok: wrote {out_path} ({len(files)} files, {total_bytes} bytes, {len(findings)} findings)")
+    # Same bytes as json.dumps(payload, indent=2), written piecewise instead of as one string.
+    with out_path.open("w", encoding="utf-8") as f:
+        f.write("{\n")
+        for key, value in header.items():
+            f.write(f"  {json.dumps(key)}: {nested_json(value, 1)},\n")
+        write_json_list(f, "files", [item for _, item in file_items])
+        f.write(",\n")
+        write_json_list(f, "findings", [item for _, item in finding_items])
+        f.write("\n}\n")
+    print(f"ok: wrote {out_path} ({len(file_items)} files, {total_bytes} bytes, {len(finding_items)} findings)")
     return 0
 
 
@@ -1,70 +1,213 @@
 #!/usr/bin/env python3
+"""
+Persistent time tracker for the timed senior engineering audit (see AUDIT.md).
+
+On-disk layout, all next to --log:
+
+- <log>         snapshot of the full state (compact JSON, or msgpack with --format)
+- <log>.events  start/tick events appended since that snapshot, one JSON line each
+- <log>.lock    sidecar for the POSIX record lock that serializes writers
+
+A tick only appends its event, so it never re-encodes the sections. The sections are
+encoded only when a snapshot is written: on pause, reset, compact, or once the event
+file grows past EVENTS_SNAPSHOT_BYTES.
+"""
+
 from __future__ import annotations
 
 import argparse
+import functools
 import json
 import os
 import sys
 import time
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
+
+try:
+    import orjson  # optional; json does the same job, just slower
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # optional; only needed for --format msgpack logs
+except ImportError:
+    msgpack = None
 
 
 DEFAULT_TARGET_SECONDS = 90 * 60
+# Once the event log grows past this, the next event folds it into a fresh snapshot.
+EVENTS_SNAPSHOT_BYTES = 64 * 1024
+SNAPSHOT_FORMATS = ("json", "msgpack")
+# A pause that leaves a section with more segments than this archives all but the newest
+# COMPACT_KEEP_SEGMENTS, so the snapshot stops growing with history.
+AUTO_COMPACT_SEGMENTS = 500
+COMPACT_KEEP_SEGMENTS = 100
 
 
 def now_epoch() -> int:
-    return int(time.time())
+    # Integer nanoseconds floor-divided: no float rounding at second boundaries.
+    return time.time_ns() // 1_000_000_000
 
 
-def now_iso() -> str:
-    return datetime.now().astimezone().isoformat(timespec="seconds")
+def now_iso(epoch: int) -> str:
+    # Formatted from the same epoch the commands use, once per invocation.
+    return datetime.fromtimestamp(epoch).astimezone().isoformat(timespec="seconds")
 
 
+@functools.cache
 def default_log_path() -> Path:
     return Path(__file__).resolve().parents[1] / ".timed_audit_clock.json"
 
 
-def _locked_open_rw(path: Path):
+@contextmanager
+def _locked(path: Path, exclusive: bool) -> Iterator[None]:
     # Cross-process lock to avoid corruption if multiple agents/tools touch the file.
+    # Held on a sidecar file, since save_state swaps the log itself out by rename.
+    # POSIX record locks (lockf) rather than flock, so NFS shares honor them too.
     # Linux-only (ok for this environment).
     import fcntl
 
     path.parent.mkdir(parents=True, exist_ok=True)
-    f = path.open("a+", encoding="utf-8")
-    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-    f.seek(0)
-    return f
+    with path.with_name(path.name + ".lock").open("a+", encoding="utf-8") as f:
+        fcntl.lockf(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.lockf(f, fcntl.LOCK_UN)
+
+
+def events_path(path: Path) -> Path:
+    # JSONL of start/tick events recorded since the snapshot in `path` was written.
+    return path.with_name(path.name + ".events")
+
+
+def decode_json(data: bytes) -> Any:
+    # Parsed straight from the file's bytes; no intermediate str.
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def read_state(path: Path) -> dict[str, Any]:
+    """Snapshot plus replayed events. The caller holds the lock (see load_state).
+
+    Also consistent enough without one, for status --fast: the snapshot only ever changes
+    by rename, and reading the events first means a snapshot taken in between just makes
+    them replay as no-ops.
+    """
+    try:
+        events = events_path(path).read_bytes()
+    except FileNotFoundError:
+        events = b""
+    try:
+        raw = path.read_bytes()
+    except FileNotFoundError:
+        raw = b""
+    if is_msgpack(raw):
+        if msgpack is None:
+            raise SystemExit(f"error: {path} is msgpack-encoded; install 'msgpack' to read it")
+        state: dict[str, Any] = msgpack.unpackb(raw, raw=False)
+    elif not raw.strip():
+        state = {
+            "version": 1,
+            "target_seconds_per_section": DEFAULT_TARGET_SECONDS,
+            "active": None,
+            "sections": {},
+        }
+    else:
+        state = decode_json(raw)
+    replay_events(state, events)
+    return state
 
 
 def load_state(path: Path) -> dict[str, Any]:
-    f = _locked_open_rw(path)
+    # Readers only need to keep a writer from renaming mid-read; they don't exclude each other.
+    with _locked(path, exclusive=False):
+        return read_state(path)
+
+
+def encode_state(state: dict[str, Any], pretty: bool = False) -> bytes:
+    # Compact by default: every start/tick/pause rewrites (and fsyncs) the whole log.
+    if pretty:
+        return (json.dumps(state, indent=2, sort_keys=False) + "\n").encode("utf-8")
+    if orjson is not None:
+        return orjson.dumps(state) + b"\n"
+    return (json.dumps(state, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def is_msgpack(raw: bytes) -> bool:
+    # The state is a map: msgpack opens with a fixmap/map16/map32 byte, JSON with "{" or space.
+    return bool(raw) and (0x80 <= raw[0] <= 0x8F or raw[0] in (0xDE, 0xDF))
+
+
+def snapshot_format(path: Path) -> str:
+    # New snapshots keep whatever format the log already uses.
     try:
-        raw = f.read()
-        if not raw.strip():
-            return {
-                "version": 1,
-                "target_seconds_per_section": DEFAULT_TARGET_SECONDS,
-                "active": None,
-                "sections": {},
-            }
-        return json.loads(raw)
-    finally:
-        f.close()
+        with path.open("rb") as f:
+            return "msgpack" if is_msgpack(f.read(1)) else "json"
+    except FileNotFoundError:
+        return "json"
 
 
-def save_state(path: Path, state: dict[str, Any]) -> None:
-    f = _locked_open_rw(path)
+def _fsync_dir(path: Path) -> None:
+    # Makes a rename/create in path's directory durable, not just the file's contents.
+    fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
     try:
-        f.seek(0)
-        f.truncate()
-        f.write(json.dumps(state, indent=2, sort_keys=False) + "\n")
-        f.flush()
-        os.fsync(f.fileno())
+        os.fsync(fd)
     finally:
-        f.close()
+        os.close(fd)
+
+
+def write_state(path: Path, state: dict[str, Any], pretty: bool = False, fmt: str | None = None) -> None:
+    """Write a full snapshot; it includes every event up to state["log_seq"].
+
+    fmt is "json" or "msgpack" (None keeps the log's current format). The caller holds
+    the exclusive lock (see save_state).
+    """
+    if fmt is None:
+        fmt = snapshot_format(path)
+    data = msgpack.packb(state) if fmt == "msgpack" else encode_state(state, pretty)
+    # Write a complete copy next to the log and rename it over; a crash mid-write
+    # leaves the previous log intact instead of a truncated one.
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as out:
+        out.write(data)
+        out.flush()
+        # Only the bytes matter; mtime and friends can be lost without harm.
+        os.fdatasync(out.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path)
+    # Folded into the snapshot. If this is lost in a crash, replay skips the
+    # events anyway: none has a seq past the snapshot's log_seq.
+    events_path(path).unlink(missing_ok=True)
+
+
+def save_state(path: Path, state: dict[str, Any], pretty: bool = False, fmt: str | None = None) -> None:
+    with _locked(path, exclusive=True):
+        write_state(path, state, pretty, fmt)
+
+
+def append_event(path: Path, event: dict[str, Any]) -> None:
+    """Durably append one event line.
+
+    The caller holds the exclusive lock.
+    """
+    line = encode_state(event)
+    with events_path(path).open("ab+") as f:
+        end = f.seek(0, os.SEEK_END)
+        if end:
+            # A crash can leave a torn last line; start on a fresh one so only that event is lost.
+            f.seek(end - 1)
+            if f.read(1) != b"\n":
+                line = b"\n" + line
+        f.write(line)
+        f.flush()
+        os.fdatasync(f.fileno())
+    if not end:
+        # Likely a brand-new file, whose directory entry has to reach the disk too.
+        _fsync_dir(path)
 
 
 def ensure_section(state: dict[str, Any], section: str) -> dict[str, Any]:
@@ -97,7 +240,7 @@ def active_effective_elapsed(state: dict[str, Any], now: int) -> int:
     return last_tick - start
 
 
-def cmd_start(state: dict[str, Any], section: str, note: str | None, now: int) -> None:
+def cmd_start(state: dict[str, Any], section: str, note: str | None, now: int, now_at: str) -> None:
     active = state.get("active")
     if active is not None:
         raise SystemExit(
@@ -108,22 +251,26 @@ def cmd_start(state: dict[str, Any], section: str, note: str | None, now: int) -
     state["active"] = {
         "section": section,
         "started_epoch": now,
-        "started_at": now_iso(),
+        "started_at": now_at,
         "last_tick_epoch": now,
-        "last_tick_at": now_iso(),
+        "last_tick_at": now_at,
         "note": note or "",
     }
 
 
-def cmd_tick(state: dict[str, Any], now: int) -> None:
+def cmd_tick(state: dict[str, Any], now: int, now_at: str) -> bool:
+    """Record the tick; returns False when it changes nothing (another tick this second)."""
     active = state.get("active")
     if not active:
         raise SystemExit("error: no active timer. Run 'start <section>' first.")
+    if active.get("last_tick_epoch") == now and active.get("last_tick_at") == now_at:
+        return False
     active["last_tick_epoch"] = now
-    active["last_tick_at"] = now_iso()
+    active["last_tick_at"] = now_at
+    return True
 
 
-def cmd_pause(state: dict[str, Any], reason: str | None, now: int) -> None:
+def cmd_pause(state: dict[str, Any], reason: str | None, now: int, now_at: str) -> None:
     active = state.get("active")
     if not active:
         raise SystemExit("error: no active timer to pause.")
@@ -140,59 +287,136 @@ def cmd_pause(state: dict[str, Any], reason: str | None, now: int) -> None:
         "start_epoch": start_epoch,
         "start_at": active.get("started_at") or "",
         "end_epoch": end_epoch,
-        "end_at": active.get("last_tick_at") or now_iso(),
+        "end_at": active.get("last_tick_at") or now_at,
         "note": active.get("note") or "",
         "reason": reason or "",
     }
     sec["segments"].append(seg)
     sec["elapsed_seconds"] = int(sec.get("elapsed_seconds") or 0) + (end_epoch - start_epoch)
+    if len(sec["segments"]) > AUTO_COMPACT_SEGMENTS:
+        compact_section(sec, COMPACT_KEEP_SEGMENTS)
 
     state["active"] = None
 
 
+def compact_section(sec: dict[str, Any], keep: int) -> int:
+    """Fold all but the newest `keep` segments into archived_* totals; returns how many went.
+
+    elapsed_seconds already counts every segment, so status is unaffected.
+    """
+    segments = sec.get("segments") or []
+    drop = len(segments) - max(0, keep)
+    if drop <= 0:
+        return 0
+    old = segments[:drop]
+    sec["archived_seconds"] = int(sec.get("archived_seconds") or 0) + sum(
+        int(seg.get("end_epoch") or 0) - int(seg.get("start_epoch") or 0) for seg in old
+    )
+    sec["archived_segments"] = int(sec.get("archived_segments") or 0) + drop
+    sec["segments"] = segments[drop:]
+    return drop
+
+
+def cmd_compact(state: dict[str, Any], keep: int) -> int:
+    sections: dict[str, Any] = state.get("sections") or {}
+    return sum(compact_section(sec, keep) for sec in sections.values())
+
+
+def apply_event(state: dict[str, Any], event: dict[str, Any]) -> None:
+    op = event.get("op")
+    t = int(event.get("t") or 0)
+    at = str(event.get("at") or "")
+    try:
+        if op == "start":
+            cmd_start(state, str(event.get("section")), event.get("note"), t, at)
+        elif op == "tick":
+            cmd_tick(state, t, at)
+    except SystemExit:
+        # Lost a race with another writer (e.g. two starts); the first one recorded wins.
+        pass
+
+
+def replay_events(state: dict[str, Any], data: bytes) -> None:
+    seq = int(state.get("log_seq") or 0)
+    for line in data.splitlines():
+        try:
+            event = decode_json(line)
+        except ValueError:
+            continue  # torn write from a crash
+        if not isinstance(event, dict) or int(event.get("seq") or 0) <= seq:
+            continue
+        apply_event(state, event)
+        seq = state["log_seq"] = int(event["seq"])
+
+
+def record_event(
+    path: Path, state: dict[str, Any], event: dict[str, Any], pretty: bool = False, fmt: str | None = None
+) -> None:
+    """Persist a command already applied to `state`: O(1) append, with a periodic snapshot.
+
+    The caller holds the exclusive lock.
+    """
+    seq = int(state.get("log_seq") or 0) + 1
+    state["log_seq"] = seq
+    try:
+        size = events_path(path).stat().st_size
+    except FileNotFoundError:
+        size = 0
+    # An explicit --format switch takes effect now rather than at the next pause.
+    if size >= EVENTS_SNAPSHOT_BYTES or (fmt is not None and fmt != snapshot_format(path)):
+        # The snapshot already holds this event, so don't append (and sync) it first:
+        # the commit is the snapshot's data sync plus the directory sync, nothing more.
+        write_state(path, state, pretty, fmt)
+        return
+    append_event(path, {"seq": seq, **event})
+
+
 def fmt_hhmmss(total_seconds: int) -> str:
-    s = max(0, int(total_seconds))
-    h = s // 3600
-    m = (s % 3600) // 60
-    sec = s % 60
+    h, rem = divmod(max(0, int(total_seconds)), 3600)
+    m, sec = divmod(rem, 60)
     return f"{h:02d}:{m:02d}:{sec:02d}"
 
 
-def cmd_status(state: dict[str, Any], now: int) -> int:
+def cmd_status(state: dict[str, Any], log_path: Path, now: int, now_at: str) -> int:
     active = state.get("active")
     active_section = active.get("section") if active else None
     active_start_epoch = int(active.get("started_epoch") or now) if active else None
     active_last_tick_epoch = int(active.get("last_tick_epoch") or active_start_epoch) if active else None
-    print(f"log: {state.get('_log_path', '(unknown)')}")
-    print(f"now: {now_iso()} (epoch {now})")
+    # Built up and written in one go: one write() instead of one per line, and no
+    # interleaving with another process printing to the same terminal or pipe.
+    lines: list[str] = []
+    lines.append(f"log: {log_path}")
+    lines.append(f"now: {now_at} (epoch {now})")
     if active:
         section = active.get("section")
         start_epoch = int(active.get("started_epoch") or now)
         last_tick = int(active.get("last_tick_epoch") or start_epoch)
         wall = now - start_epoch
         effective = last_tick - start_epoch
-        print(f"active: {section} (started {active.get('started_at')})")
-        print(f"  wall_since_start: {fmt_hhmmss(wall)}")
-        print(f"  effective_since_start (ticked): {fmt_hhmmss(effective)}")
+        lines.append(f"active: {section} (started {active.get('started_at')})")
+        lines.append(f"  wall_since_start: {fmt_hhmmss(wall)}")
+        lines.append(f"  effective_since_start (ticked): {fmt_hhmmss(effective)}")
         if active.get("note"):
-            print(f"  note: {active.get('note')}")
+            lines.append(f"  note: {active.get('note')}")
     else:
-        print("active: (none)")
+        lines.append("active: (none)")
 
     sections: dict[str, Any] = state.get("sections") or {}
     if not sections:
-        print("sections: (none)")
+        lines.append("sections: (none)")
+        sys.stdout.write("\n".join(lines) + "\n")
         return 0
 
-    print("\nsections:")
+    lines.append("\nsections:")
     exit_code = 0
-    for name in sorted(sections.keys()):
-        sec = sections[name]
+    # Only the active section has uncommitted time; work it out once, not per section.
+    active_ticked = 0
+    if active_start_epoch is not None and active_last_tick_epoch is not None:
+        active_ticked = max(0, active_last_tick_epoch - active_start_epoch)
+    for name, sec in sorted(sections.items()):
         target = int(sec.get("target_seconds") or DEFAULT_TARGET_SECONDS)
         committed = int(sec.get("elapsed_seconds") or 0)
-        active_effective = 0
-        if active_section == name and active_start_epoch is not None and active_last_tick_epoch is not None:
-            active_effective = max(0, active_last_tick_epoch - active_start_epoch)
+        active_effective = active_ticked if name == active_section else 0
         elapsed = committed + active_effective
         remaining = max(0, target - elapsed)
         pct = 0.0 if target <= 0 else (elapsed / target) * 100.0
@@ -201,17 +425,20 @@ def cmd_status(state: dict[str, Any], now: int) -> int:
         extra = ""
         if active_effective:
             extra = f" (committed {fmt_hhmmss(committed)} + active {fmt_hhmmss(active_effective)})"
-        print(
+        lines.append(
             f"- {name}: {marker} elapsed={fmt_hhmmss(elapsed)} target={fmt_hhmmss(target)} "
             f"remaining={fmt_hhmmss(remaining)} ({pct:.1f}%){extra}"
         )
         if not done:
             exit_code = 2
 
+    sys.stdout.write("\n".join(lines) + "\n")
     return exit_code
 
 
-def parse_args(argv: list[str]) -> argparse.Namespace:
+@functools.cache
+def build_parser() -> argparse.ArgumentParser:
+    # Built once per process; main() may be called repeatedly by code importing this module.
     parser = argparse.ArgumentParser(
         description="Persistent time tracker for the timed senior engineering audit."
     )
@@ -220,6 +447,18 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
         default=str(default_log_path()),
         help="Path to the timer log JSON (default: repo/.timed_audit_clock.json)",
     )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="Write the log indented for reading by hand (default: compact JSON)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=SNAPSHOT_FORMATS,
+        default=None,
+        help="Snapshot encoding to write (default: keep the log's current one, json for a new "
+        "log). msgpack is smaller and faster to load; reading auto-detects either.",
+    )
 
     sub = parser.add_subparsers(dest="cmd", required=True)
 
@@ -236,57 +475,87 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
     pause.add_argument("--reason", default=None, help="Why we paused (e.g., awaiting user).")
 
     status = sub.add_parser("status", help="Show total elapsed/remaining by section.")
+    status.add_argument(
+        "--fast",
+        action="store_true",
+        help="Read without taking the lock; may miss a command that is finishing right now.",
+    )
+
+    compact = sub.add_parser(
+        "compact",
+        help="Archive old segments into per-section totals (elapsed time is unchanged).",
+    )
+    compact.add_argument(
+        "--keep",
+        type=int,
+        default=COMPACT_KEEP_SEGMENTS,
+        help=f"Segments to keep per section (default: {COMPACT_KEEP_SEGMENTS}).",
+    )
 
     reset = sub.add_parser("reset", help="Danger: reset the log (clears all sections and active).")
     reset.add_argument("--yes", action="store_true", help="Confirm reset.")
 
-    return parser.parse_args(argv)
+    return parser
 
 
-def cmd_reset(state: dict[str, Any], yes: bool) -> dict[str, Any]:
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    return build_parser().parse_args(argv)
+
+
+def cmd_reset(state: dict[str, Any], yes: bool) -> None:
     if not yes:
         raise SystemExit("error: refusing to reset without --yes")
-    return {
-        "version": 1,
-        "target_seconds_per_section": int(state.get("target_seconds_per_section") or DEFAULT_TARGET_SECONDS),
-        "active": None,
-        "sections": {},
-    }
+    target = int(state.get("target_seconds_per_section") or DEFAULT_TARGET_SECONDS)
+    # Kept so events already in the old log can never replay onto the fresh state.
+    log_seq = int(state.get("log_seq") or 0)
+    # Emptied in place, like the other commands' edits, rather than swapped for a new dict.
+    state.clear()
+    state["version"] = 1
+    state["target_seconds_per_section"] = target
+    state["active"] = None
+    state["sections"] = {}
+    state["log_seq"] = log_seq
 
 
 def main(argv: list[str]) -> int:
     args = parse_args(argv)
+    if args.format == "msgpack" and msgpack is None:
+        build_parser().error("--format msgpack requires the 'msgpack' package")
     log_path = Path(args.log).resolve()
     now = now_epoch()
-
-    state = load_state(log_path)
-    state["_log_path"] = str(log_path)
-
-    if args.cmd == "start":
-        cmd_start(state, args.section, args.note, now)
-        save_state(log_path, {k: v for k, v in state.items() if k != "_log_path"})
-        return cmd_status(state, now)
-
-    if args.cmd == "tick":
-        cmd_tick(state, now)
-        save_state(log_path, {k: v for k, v in state.items() if k != "_log_path"})
-        return cmd_status(state, now)
-
-    if args.cmd == "pause":
-        cmd_pause(state, args.reason, now)
-        save_state(log_path, {k: v for k, v in state.items() if k != "_log_path"})
-        return cmd_status(state, now)
-
-    if args.cmd == "status":
-        return cmd_status(state, now)
-
-    if args.cmd == "reset":
-        state = cmd_reset(state, args.yes)
-        save_state(log_path, state)
-        state["_log_path"] = str(log_path)
-        return cmd_status(state, now)
-
-    raise SystemExit(f"error: unknown cmd {args.cmd}")
+    now_at = now_iso(now)
+
+    if args.cmd == "status" and args.fast:
+        return cmd_status(read_state(log_path), log_path, now, now_at)
+
+    # One lock from read to write: nothing can land between our load and our save.
+    # status only reads, so concurrent ones share it.
+    with _locked(log_path, exclusive=args.cmd != "status"):
+        state = read_state(log_path)
+
+        if args.cmd == "start":
+            cmd_start(state, args.section, args.note, now, now_at)
+            event = {"op": "start", "t": now, "at": now_at, "section": args.section, "note": args.note}
+            record_event(log_path, state, event, args.pretty, args.format)
+        elif args.cmd == "tick":
+            if cmd_tick(state, now, now_at):
+                record_event(log_path, state, {"op": "tick", "t": now, "at": now_at}, args.pretty, args.format)
+        elif args.cmd == "pause":
+            cmd_pause(state, args.reason, now, now_at)
+            write_state(log_path, state, args.pretty, args.format)
+        elif args.cmd == "compact":
+            dropped = cmd_compact(state, args.keep)
+            if dropped:
+                write_state(log_path, state, args.pretty, args.format)
+            print(f"compacted: {dropped} segment(s) archived")
+        elif args.cmd == "reset":
+            cmd_reset(state, args.yes)
+            write_state(log_path, state, args.pretty, args.format)
+        elif args.cmd != "status":
+            raise SystemExit(f"error: unknown cmd {args.cmd}")
+
+    # Reported from the state just persisted, after the lock is released.
+    return cmd_status(state, log_path, now, now_at)
 
 
 if __name__ == "__main__":